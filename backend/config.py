@@ -12,12 +12,73 @@ class Config:
     UPLOAD_FILE = './uploads'  # 文件上传路径
     UPLOAD_MODEL = './models'  # 文件上传路径
     REPORT_FOLDER = './reports'  # 报告文件夹
+    BASE_DIR = '/root/My_Project/backend'  # 部署目录，上传文件、模型和报告都在其下
+    REPORT_DIR = os.path.join(BASE_DIR, 'reports')  # 诊断报告与图像的保存目录
+    WORKSPACE_ROOT = os.path.join(BASE_DIR, 'workspaces')  # 诊断任务临时工作目录的根目录
+    PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')  # 诊断剖析结果的保存目录，不在 REPORT_DIR 下，不能通过 /reports 公开访问
     SECRET_KEY = 'your-secret-key'
     SSL_CERTIFICATE = 'server.crt'  # 证书文件路
     SESSION_TYPE = 'filesystem'  # 设置 Flask Session 存储类型
     SESSION_TYPE = 'filesystem'  # 设置 Flask Session 存储类型
     SESSION_COOKIE_HTTPONLY = True  # 限制 JavaScript 访问 session cookie
     PERMANENT_SESSION_LIFETIME = 3600  # 设置 session 过期时间，单位为秒
-    ALLOWED_EXTENSIONS = {'h5', 'pt', 'pkl', 'onnx'}  # 允许的模型文件扩展名
-
-
+    ALLOWED_EXTENSIONS = {'h5', 'pt', 'zip', 'pkl', 'onnx'}  # 允许的模型文件扩展名
+    INFERENCE_POOL_SIZE = 2  # 常驻推理进程数
+    INFERENCE_TORCH_THREADS = 2  # 每个推理进程内 torch 使用的线程数
+    INFERENCE_TASK_TIMEOUT = 1800  # 单次诊断任务的最长等待时间，单位为秒
+    MODEL_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 每个推理进程的模型缓存内存预算，单位为字节
+    MODEL_CACHE_KEY = 'mtime'  # 模型缓存键：'mtime' 修改时间 + 文件大小，'sha256' 文件内容哈希
+    DIAGNOSIS_JOB_WORKERS = 4  # 同时执行的异步诊断任务数
+    JOB_TTL = 3600  # 已结束的异步任务保留时间，单位为秒
+    INFERENCE_WORKER_CONCURRENCY = 4  # 每个推理进程内同时执行的诊断任务数
+    INFERENCE_MAX_BATCH_SIZE = 128  # 合并并发请求后的最大批量
+    INFERENCE_MAX_QUEUE_DELAY = 0.01  # 等待其他请求凑批的最长时间，单位为秒
+    COMPILED_MODEL_FOLDER = './models/compiled'  # 预编译推理文件目录
+    MODEL_COMPILE_ON_UPLOAD = True  # 上传模型后是否在后台生成预编译推理文件
+    MODEL_COMPILE_BENCHMARK_BATCH = 8  # 延迟对比使用的批量
+    MODEL_COMPILE_BENCHMARK_RUNS = 10  # 延迟对比的测量次数
+    MODEL_PARITY_TOLERANCE = 1e-3  # 转换后模型与 eager 模型输出允许的最大差异
+    MODEL_EXPORT_ONNX_ON_UPLOAD = False  # 上传模型后是否在后台导出 ONNX（需要安装 onnxruntime）
+    ONNX_OPSET_VERSION = 17  # 导出 ONNX 使用的 opset 版本
+    PRECISION_MAX_ACCURACY_DROP = 0.01  # 低精度模式相对 fp32 允许的最大准确率下降
+    DATASET_CSV_CHUNK_ROWS = 64  # 流式解析测试数据 CSV 时每块的行数
+    DATASET_CACHE_ENABLED = True  # 是否把测试数据转换为可内存映射的二进制缓存
+    DATASET_CACHE_FOLDER = './uploads/dataset_cache'  # 二进制数据集缓存目录，按文件内容的 SHA-256 命名
+    EVAL_LOGIT_SAMPLE_SIZE = 2000  # 评估时保留用于可视化的 logits 样本数，与测试集大小无关
+    EMBEDDING_MAX_POINTS = 1000  # 降维图最多使用的点数，超过时按类别分层抽样
+    EMBEDDING_PRECOMPUTE = False  # 诊断完成后是否在后台预先绘制 t-SNE 图，否则在第一次查看时绘制
+    EMBEDDING_RENDER_WAIT = 10  # 查看降维图时等待绘制完成的最长时间，超过时返回 202，单位为秒
+    EMBEDDING_RENDER_RETRY_AFTER = 5  # 绘制未完成时建议客户端重试的间隔，单位为秒
+    REPORT_IMAGE_MAX_WIDTH = 1200  # 嵌入 PDF 报告的图像最大宽度，单位为像素
+    LIST_DEFAULT_LIMIT = 100  # 列表接口游标分页的默认条数
+    LIST_MAX_LIMIT = 1000  # 列表接口单页最多条数
+    LIST_COUNT_CACHE_TTL = 30  # 列表总数的缓存时间，单位为秒
+    WRITE_BEHIND_FLUSH_INTERVAL = 5  # 合并后的登录时间等簿记更新的写入间隔，单位为秒
+    WRITE_BEHIND_MAX_PENDING = 500  # 待写入的行数达到该值时立即写入
+    RESPONSE_CACHE_SIZE = 256  # 列表接口缓存的响应条数
+    RESPONSE_CACHE_MAX_STALENESS = 60  # 表版本号之外，缓存的响应最长复用时间，单位为秒，用于覆盖绕过接口的数据修改
+    RESPONSE_GZIP_MIN_SIZE = 1024  # 超过该字节数的缓存响应使用 gzip 压缩
+    ARTIFACT_CACHE_MAX_AGE = 365 * 24 * 3600  # 文件名唯一、内容不再变化的报告与图像的浏览器缓存时间，单位为秒
+    ARTIFACT_SENDFILE = None  # 交给前端代理发送文件：None 由 Flask 发送，'x-accel-redirect'（nginx）或 'x-sendfile'（Apache 等）
+    ARTIFACT_ACCEL_PREFIX = '/protected-reports'  # nginx 中映射到 REPORT_DIR 的 internal location
+    LOG_FOLDER = './logs'  # 日志目录
+    LOG_LEVEL = 'INFO'  # 默认日志级别
+    LOG_LEVELS = {'sqlalchemy.engine': 'WARNING', 'matplotlib': 'WARNING', 'PIL': 'WARNING'}  # 按模块单独设置的日志级别
+    LOG_MAX_BYTES = 50 * 1024 * 1024  # 单个日志文件的大小上限，超过后轮转，单位为字节
+    LOG_BACKUP_COUNT = 10  # 保留的历史日志文件数
+    LOG_QUEUE_SIZE = 10000  # 等待写入的日志条数上限，队列满时丢弃新日志而不阻塞请求
+    LOG_DEBUG_SAMPLE_RATE = 0.1  # DEBUG 日志的采样比例，每个模块按该比例保留
+    LOG_MAX_MESSAGE_LENGTH = 4096  # 单条日志消息的最大长度，超出部分截断
+    LOG_CONSOLE = True  # 是否同时输出到控制台
+    PROFILE_TRACE_BATCHES = 20  # 剖析时 torch.profiler 记录的前向计算批次数
+    PROFILE_TOP_FUNCTIONS = 50  # 剖析报告中列出的函数和算子数
+    PROFILE_TRACEMALLOC_FRAMES = 10  # tracemalloc 为每次分配保存的调用栈深度
+    PROFILE_TOP_ALLOCATIONS = 30  # memory.json 中列出的仍存活的分配位置数
+    JWT_SECRET_KEY = 'your_secret_key'  # 签发和校验登录 token 的密钥
+    JWT_ALGORITHM = 'HS256'  # token 签名算法
+    JWT_EXPIRES_IN = 3600  # token 有效期，单位为秒
+    AUTH_CACHE_SIZE = 4096  # 已校验 token 的缓存条数
+    AUTH_CACHE_TTL = 300  # 已校验 token 的缓存时间，单位为秒，不会超过 token 本身的过期时间
+    AUTH_REQUIRED = False  # 是否要求所有接口携带有效 token，登录、注册等公开接口除外
+    METRICS_PUBLIC = False  # 是否允许未登录的客户端访问 /metrics，关闭时需要管理员 token 或 METRICS_SCRAPE_TOKEN
+    METRICS_SCRAPE_TOKEN = None  # Prometheus 抓取 /metrics 时携带的 Bearer token，为空时只有管理员可以访问
@@ -0,0 +1,58 @@
+"""add hot lookup indexes
+
+Revision ID: 0b6e8f2d4c97
+Revises: f1c93b5e7a26
+Create Date: 2026-10-18 16:48:02.771536
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6e8f2d4c97'
+down_revision = 'f1c93b5e7a26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_Users_created_at'), ['created_at'], unique=False)
+
+    with op.batch_alter_table('Files', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_Files_file_name'), ['file_name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_Files_upload_time'), ['upload_time'], unique=False)
+
+    with op.batch_alter_table('Models', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_Models_model_name'), ['model_name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_Models_upload_time'), ['upload_time'], unique=False)
+
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_Diagnosis_Records_file_id'), ['file_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_Diagnosis_Records_model_id'), ['model_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_Diagnosis_Records_created_at'), ['created_at'], unique=False)
+
+    with op.batch_alter_table('Data_Management', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_Data_Management_upload_time'), ['upload_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Data_Management', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_Data_Management_upload_time'))
+
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_Diagnosis_Records_created_at'))
+        batch_op.drop_index(batch_op.f('ix_Diagnosis_Records_model_id'))
+        batch_op.drop_index(batch_op.f('ix_Diagnosis_Records_file_id'))
+
+    with op.batch_alter_table('Models', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_Models_upload_time'))
+        batch_op.drop_index(batch_op.f('ix_Models_model_name'))
+
+    with op.batch_alter_table('Files', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_Files_upload_time'))
+        batch_op.drop_index(batch_op.f('ix_Files_file_name'))
+
+    with op.batch_alter_table('Users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_Users_created_at'))
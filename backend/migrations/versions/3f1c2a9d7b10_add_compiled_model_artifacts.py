@@ -0,0 +1,34 @@
+"""add compiled model artifacts
+
+Revision ID: 3f1c2a9d7b10
+Revises: 
+Create Date: 2026-10-18 10:12:41.203518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Models', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('compiled_path', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('compile_status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('compile_error', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('eager_latency_ms', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('compiled_latency_ms', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('Models', schema=None) as batch_op:
+        batch_op.drop_column('compiled_latency_ms')
+        batch_op.drop_column('eager_latency_ms')
+        batch_op.drop_column('compile_error')
+        batch_op.drop_column('compile_status')
+        batch_op.drop_column('compiled_path')
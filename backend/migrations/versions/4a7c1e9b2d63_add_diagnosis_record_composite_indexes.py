@@ -0,0 +1,37 @@
+"""add diagnosis record composite indexes
+
+Revision ID: 4a7c1e9b2d63
+Revises: 9d4f7b2e6a51
+Create Date: 2026-10-18 21:05:14.218930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a7c1e9b2d63'
+down_revision = '9d4f7b2e6a51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 先建组合索引再删单列索引，MySQL 的外键始终有可用的索引
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.create_index('ix_Diagnosis_Records_file_id_created_at', ['file_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_Diagnosis_Records_model_id_created_at', ['model_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_Diagnosis_Records_model_id'))
+        batch_op.drop_index(batch_op.f('ix_Diagnosis_Records_file_id'))
+
+
+def downgrade():
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_Diagnosis_Records_file_id'), ['file_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_Diagnosis_Records_model_id'), ['model_id'], unique=False)
+
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.drop_index('ix_Diagnosis_Records_model_id_created_at')
+        batch_op.drop_index('ix_Diagnosis_Records_file_id_created_at')
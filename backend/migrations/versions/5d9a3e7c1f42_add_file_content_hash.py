@@ -0,0 +1,28 @@
+"""add file content hash
+
+Revision ID: 5d9a3e7c1f42
+Revises: c27d9e04f6b8
+Create Date: 2026-10-18 14:21:07.318245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d9a3e7c1f42'
+down_revision = 'c27d9e04f6b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_Files_content_hash'), ['content_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Files', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_Files_content_hash'))
+        batch_op.drop_column('content_hash')
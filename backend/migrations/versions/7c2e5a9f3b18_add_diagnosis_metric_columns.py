@@ -0,0 +1,113 @@
+"""add diagnosis metric columns and rollups
+
+Revision ID: 7c2e5a9f3b18
+Revises: 0b6e8f2d4c97
+Create Date: 2026-10-18 17:20:41.318204
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e5a9f3b18'
+down_revision = '0b6e8f2d4c97'
+branch_labels = None
+depends_on = None
+
+METRICS = ('accuracy', 'precision', 'recall', 'f1', 'specificity')
+BACKFILL_BATCH = 1000
+
+
+def _rollup_columns():
+    return [sa.Column('diagnoses', sa.Integer(), nullable=False)] + [
+        sa.Column(f'{metric}_sum', sa.Float(), nullable=False) for metric in METRICS]
+
+
+def _backfill():
+    # 从 diagnosis_result 的 JSON 中解析指标写入数值列，并在内存中聚合出汇总表
+    bind = op.get_bind()
+    records = sa.table('Diagnosis_Records', sa.column('record_id', sa.Integer), sa.column('model_id', sa.Integer),
+                       sa.column('diagnosis_result', sa.Text), sa.column('created_at', sa.DateTime),
+                       *[sa.column(metric, sa.Float) for metric in METRICS])
+    model_rollups = sa.table('Model_Metric_Rollups', sa.column('model_id', sa.Integer),
+                             sa.column('diagnoses', sa.Integer), sa.column('best_accuracy', sa.Float),
+                             sa.column('last_diagnosis_at', sa.DateTime),
+                             *[sa.column(f'{metric}_sum', sa.Float) for metric in METRICS])
+    daily_rollups = sa.table('Daily_Metric_Rollups', sa.column('day', sa.Date), sa.column('model_id', sa.Integer),
+                             sa.column('diagnoses', sa.Integer),
+                             *[sa.column(f'{metric}_sum', sa.Float) for metric in METRICS])
+
+    by_model, by_day = {}, {}
+    update = records.update().where(records.c.record_id == sa.bindparam('_record_id')) \
+        .values({metric: sa.bindparam(f'_{metric}') for metric in METRICS})
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(records.c.record_id, records.c.model_id, records.c.diagnosis_result, records.c.created_at)
+            .where(records.c.record_id > last_id).order_by(records.c.record_id).limit(BACKFILL_BATCH)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].record_id
+
+        params = []
+        for row in rows:
+            try:
+                data = json.loads(row.diagnosis_result or '{}')
+            except ValueError:
+                continue
+            metrics = {metric: float(data[metric]) if data.get(metric) is not None else None for metric in METRICS}
+            params.append(dict(_record_id=row.record_id, **{f'_{k}': v for k, v in metrics.items()}))
+            if row.model_id is None or row.created_at is None or metrics['accuracy'] is None:
+                continue
+            for rollup in (by_model.setdefault(row.model_id, dict(model_id=row.model_id)),
+                           by_day.setdefault((row.created_at.date(), row.model_id),
+                                             dict(day=row.created_at.date(), model_id=row.model_id))):
+                rollup['diagnoses'] = rollup.get('diagnoses', 0) + 1
+                for metric, value in metrics.items():
+                    rollup[f'{metric}_sum'] = rollup.get(f'{metric}_sum', 0.0) + (value or 0.0)
+            model_rollup = by_model[row.model_id]
+            model_rollup['best_accuracy'] = max(model_rollup.get('best_accuracy') or 0.0, metrics['accuracy'])
+            model_rollup['last_diagnosis_at'] = max(model_rollup.get('last_diagnosis_at') or row.created_at,
+                                                    row.created_at)
+        if params:
+            bind.execute(update, params)
+
+    if by_model:
+        op.bulk_insert(model_rollups, list(by_model.values()))
+    if by_day:
+        op.bulk_insert(daily_rollups, list(by_day.values()))
+
+
+def upgrade():
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        for metric in METRICS:
+            batch_op.add_column(sa.Column(metric, sa.Float(), nullable=True))
+            batch_op.create_index(batch_op.f(f'ix_Diagnosis_Records_{metric}'), [metric], unique=False)
+
+    op.create_table('Model_Metric_Rollups',
+                    sa.Column('model_id', sa.Integer(), nullable=False),
+                    *_rollup_columns(),
+                    sa.Column('best_accuracy', sa.Float(), nullable=True),
+                    sa.Column('last_diagnosis_at', sa.DateTime(), nullable=True),
+                    sa.PrimaryKeyConstraint('model_id'))
+    op.create_table('Daily_Metric_Rollups',
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('model_id', sa.Integer(), nullable=False),
+                    *_rollup_columns(),
+                    sa.PrimaryKeyConstraint('day', 'model_id'))
+
+    _backfill()
+
+
+def downgrade():
+    op.drop_table('Daily_Metric_Rollups')
+    op.drop_table('Model_Metric_Rollups')
+
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        for metric in reversed(METRICS):
+            batch_op.drop_index(batch_op.f(f'ix_Diagnosis_Records_{metric}'))
+            batch_op.drop_column(metric)
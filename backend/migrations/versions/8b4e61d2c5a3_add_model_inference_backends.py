@@ -0,0 +1,34 @@
+"""add model inference backends
+
+Revision ID: 8b4e61d2c5a3
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 11:40:07.518622
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e61d2c5a3'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Models', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('backend', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('onnx_path', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('onnx_status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('onnx_error', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('onnx_latency_ms', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('Models', schema=None) as batch_op:
+        batch_op.drop_column('onnx_latency_ms')
+        batch_op.drop_column('onnx_error')
+        batch_op.drop_column('onnx_status')
+        batch_op.drop_column('onnx_path')
+        batch_op.drop_column('backend')
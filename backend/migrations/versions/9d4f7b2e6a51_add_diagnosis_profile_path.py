@@ -0,0 +1,26 @@
+"""add diagnosis profile path
+
+Revision ID: 9d4f7b2e6a51
+Revises: 7c2e5a9f3b18
+Create Date: 2026-10-18 20:12:36.904518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4f7b2e6a51'
+down_revision = '7c2e5a9f3b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('profile_path', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.drop_column('profile_path')
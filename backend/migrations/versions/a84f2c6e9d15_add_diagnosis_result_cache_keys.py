@@ -0,0 +1,36 @@
+"""add diagnosis result cache keys
+
+Revision ID: a84f2c6e9d15
+Revises: 5d9a3e7c1f42
+Create Date: 2026-10-18 14:58:33.604127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a84f2c6e9d15'
+down_revision = '5d9a3e7c1f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Models', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_Models_content_hash'), ['content_hash'], unique=False)
+
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cache_key', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_Diagnosis_Records_cache_key'), ['cache_key'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_Diagnosis_Records_cache_key'))
+        batch_op.drop_column('cache_key')
+
+    with op.batch_alter_table('Models', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_Models_content_hash'))
+        batch_op.drop_column('content_hash')
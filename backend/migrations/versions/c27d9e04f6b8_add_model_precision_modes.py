@@ -0,0 +1,38 @@
+"""add model precision modes
+
+Revision ID: c27d9e04f6b8
+Revises: 8b4e61d2c5a3
+Create Date: 2026-10-18 13:05:52.861904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27d9e04f6b8'
+down_revision = '8b4e61d2c5a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Models', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('precision_mode', sa.String(length=10), nullable=True))
+        batch_op.add_column(sa.Column('precision_candidate', sa.String(length=10), nullable=True))
+        batch_op.add_column(sa.Column('precision_status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('precision_error', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('precision_fp32_accuracy', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('precision_accuracy', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('precision_speedup', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('Models', schema=None) as batch_op:
+        batch_op.drop_column('precision_speedup')
+        batch_op.drop_column('precision_accuracy')
+        batch_op.drop_column('precision_fp32_accuracy')
+        batch_op.drop_column('precision_error')
+        batch_op.drop_column('precision_status')
+        batch_op.drop_column('precision_candidate')
+        batch_op.drop_column('precision_mode')
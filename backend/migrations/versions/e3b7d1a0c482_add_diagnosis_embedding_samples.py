@@ -0,0 +1,26 @@
+"""add diagnosis embedding samples
+
+Revision ID: e3b7d1a0c482
+Revises: a84f2c6e9d15
+Create Date: 2026-10-18 15:37:19.482016
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7d1a0c482'
+down_revision = 'a84f2c6e9d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('embedding_path', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('Diagnosis_Records', schema=None) as batch_op:
+        batch_op.drop_column('embedding_path')
@@ -0,0 +1,28 @@
+"""add report status
+
+Revision ID: f1c93b5e7a26
+Revises: e3b7d1a0c482
+Create Date: 2026-10-18 16:12:45.093571
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c93b5e7a26'
+down_revision = 'e3b7d1a0c482'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Reports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('error', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('Reports', schema=None) as batch_op:
+        batch_op.drop_column('error')
+        batch_op.drop_column('status')
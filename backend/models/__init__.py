@@ -4,5 +4,5 @@ from flask_sqlalchemy import SQLAlchemy
 # 初始化数据库对象
 db = SQLAlchemy()
 
-from .models import User, File, Model, DiagnosisRecord, Report, DataManagement, db
+from .models import User, File, Model, DiagnosisRecord, Report, DataManagement, ModelMetricRollup, DailyMetricRollup, db
 
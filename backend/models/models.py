@@ -11,7 +11,7 @@ class User(db.Model):
     username = db.Column(db.String(255), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     email = db.Column(db.String(255), nullable=True)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)  # 用户列表按创建时间分页
     last_login = db.Column(db.DateTime)
     role = db.Column(db.Enum('admin', 'user', name='role_enum'), nullable=False)
 
@@ -21,11 +21,12 @@ class File(db.Model):
     
     file_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('Users.user_id'), nullable=True)  # 关联 Users 表
-    file_name = db.Column(db.String(255), nullable=False)
+    file_name = db.Column(db.String(255), nullable=False, index=True)  # 上传时按文件名检查重复
     file_path = db.Column(db.String(255), nullable=False)
     file_format = db.Column(db.String(50))
     file_size = db.Column(db.String(50)) 
-    upload_time = db.Column(db.DateTime, default=db.func.current_timestamp())
+    upload_time = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)  # 列表按上传时间分页
+    content_hash = db.Column(db.String(64), index=True)  # 文件内容的 SHA-256，用作二进制数据集缓存的键
     
     def __repr__(self):
         return f'<File {self.file_name}>'
@@ -35,10 +36,28 @@ class Model(db.Model):
     __tablename__ = 'Models'  # 显式指定表名为 'Models'
     
     model_id = db.Column(db.Integer, primary_key=True)
-    model_name = db.Column(db.String(255))
+    model_name = db.Column(db.String(255), index=True)  # 上传时按模型名检查重复
     model_size = db.Column(db.String(50))  # size 字段
     model_path = db.Column(db.String(255))
-    upload_time = db.Column(db.DateTime, default=db.func.current_timestamp())  # 默认当前时间
+    upload_time = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)  # 默认当前时间，列表按其分页
+    compiled_path = db.Column(db.String(255))  # 预编译的 TorchScript 推理文件路径
+    compile_status = db.Column(db.String(20))  # 预编译状态：pending / ready / failed
+    compile_error = db.Column(db.Text)  # 预编译失败原因
+    eager_latency_ms = db.Column(db.Float)  # eager 模式单批推理延迟
+    compiled_latency_ms = db.Column(db.Float)  # 预编译后单批推理延迟
+    backend = db.Column(db.String(20))  # 指定的推理后端：pytorch / torchscript / onnxruntime，为空时自动选择
+    onnx_path = db.Column(db.String(255))  # ONNX 模型文件路径
+    onnx_status = db.Column(db.String(20))  # ONNX 导出状态：pending / ready / failed
+    onnx_error = db.Column(db.Text)  # ONNX 导出失败原因
+    onnx_latency_ms = db.Column(db.Float)  # ONNX Runtime 单批推理延迟
+    precision_mode = db.Column(db.String(10))  # 启用的低精度推理模式：int8 / bf16，为空时使用 fp32
+    precision_candidate = db.Column(db.String(10))  # 最近一次评估的精度模式
+    precision_status = db.Column(db.String(20))  # 精度评估状态：pending / ready / rejected / failed
+    precision_error = db.Column(db.Text)  # 精度评估失败或被拒绝的原因
+    precision_fp32_accuracy = db.Column(db.Float)  # 评估数据集上的 fp32 准确率
+    precision_accuracy = db.Column(db.Float)  # 评估数据集上该精度模式的准确率
+    precision_speedup = db.Column(db.Float)  # 该精度模式相对 fp32 的加速比
+    content_hash = db.Column(db.String(64), index=True)  # 模型文件内容的 SHA-256，用作诊断结果缓存键的一部分
 
     def __repr__(self):
         return f'<Model {self.model_name}>'
@@ -46,14 +65,27 @@ class Model(db.Model):
 # 诊断记录表
 class DiagnosisRecord(db.Model):
     __tablename__ = 'Diagnosis_Records'  # 显式指定表名为 'Diagnosis_Records'
+    # 按文件或模型过滤后按时间排序的列表使用组合索引，无需额外排序；组合索引同时用于外键
+    __table_args__ = (
+        db.Index('ix_Diagnosis_Records_file_id_created_at', 'file_id', 'created_at'),
+        db.Index('ix_Diagnosis_Records_model_id_created_at', 'model_id', 'created_at'),
+    )
     
     record_id = db.Column(db.Integer, primary_key=True, autoincrement=True)  # 诊断记录ID
     file_id = db.Column(db.Integer, db.ForeignKey('Files.file_id'))  # 关联的文件ID
     model_id = db.Column(db.Integer, db.ForeignKey('Models.model_id'))  # 关联的模型ID
     diagnosis_result = db.Column(db.Text)  # 诊断结果
+    accuracy = db.Column(db.Float, index=True)  # 准确率，与 diagnosis_result 中的值相同，便于按指标查询和排序
+    precision = db.Column(db.Float, index=True)  # 精确率
+    recall = db.Column(db.Float, index=True)  # 召回率
+    f1 = db.Column(db.Float, index=True)  # F1 分数
+    specificity = db.Column(db.Float, index=True)  # 特异性
     tsne_path = db.Column(db.String(255))  # 存储 t-SNE 图的路径
     confusion_matrix_path = db.Column(db.String(255))  # 存储混淆矩阵图的路径
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())  # 创建时间
+    embedding_path = db.Column(db.String(255))  # 用于绘制降维图的 logits 样本路径
+    profile_path = db.Column(db.String(255))  # 剖析结果目录，只有管理员开启剖析的诊断才有
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)  # 创建时间
+    cache_key = db.Column(db.String(64), index=True)  # 诊断结果缓存键，输入文件被删除后置空
     
     # 可选：定义与 Report 的关系
     report_id = db.Column(db.Integer, db.ForeignKey('Reports.report_id'))
@@ -73,6 +105,8 @@ class Report(db.Model):
     report_name = db.Column(db.String(255))  # 报告名称
     report_format = db.Column(db.String(50))  # 报告格式（可以为PDF, HTML等）
     report_path = db.Column(db.String(255), nullable=False)  # 报告保存路径
+    status = db.Column(db.String(20))  # 生成状态：pending / ready / failed，早期生成的报告为空
+    error = db.Column(db.Text)  # 生成失败原因
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())  # 创建时间
     
     # Back relationship to DiagnosisRecord
@@ -81,6 +115,33 @@ class Report(db.Model):
     def __repr__(self):
         return f'<Report {self.report_name}>'
 
+# 按模型汇总的诊断指标，新增和删除诊断记录时增量维护
+class ModelMetricRollup(db.Model):
+    __tablename__ = 'Model_Metric_Rollups'  # 显式指定表名为 'Model_Metric_Rollups'
+
+    model_id = db.Column(db.Integer, primary_key=True)  # 模型ID，模型删除后保留历史统计
+    diagnoses = db.Column(db.Integer, nullable=False, default=0)  # 诊断次数
+    accuracy_sum = db.Column(db.Float, nullable=False, default=0)  # 各指标之和，除以诊断次数得到平均值
+    precision_sum = db.Column(db.Float, nullable=False, default=0)
+    recall_sum = db.Column(db.Float, nullable=False, default=0)
+    f1_sum = db.Column(db.Float, nullable=False, default=0)
+    specificity_sum = db.Column(db.Float, nullable=False, default=0)
+    best_accuracy = db.Column(db.Float)  # 最高准确率
+    last_diagnosis_at = db.Column(db.DateTime)  # 最近一次诊断时间
+
+# 按天和模型汇总的诊断指标，新增和删除诊断记录时增量维护
+class DailyMetricRollup(db.Model):
+    __tablename__ = 'Daily_Metric_Rollups'  # 显式指定表名为 'Daily_Metric_Rollups'
+
+    day = db.Column(db.Date, primary_key=True)  # 诊断日期，主键以日期开头以便按日期范围查询
+    model_id = db.Column(db.Integer, primary_key=True)  # 模型ID
+    diagnoses = db.Column(db.Integer, nullable=False, default=0)  # 诊断次数
+    accuracy_sum = db.Column(db.Float, nullable=False, default=0)  # 各指标之和，除以诊断次数得到平均值
+    precision_sum = db.Column(db.Float, nullable=False, default=0)
+    recall_sum = db.Column(db.Float, nullable=False, default=0)
+    f1_sum = db.Column(db.Float, nullable=False, default=0)
+    specificity_sum = db.Column(db.Float, nullable=False, default=0)
+
 
 
 
@@ -92,4 +153,4 @@ class DataManagement(db.Model):
     data_type = db.Column(db.Enum('file', 'model', name='data_type_enum'), nullable=False)
     data_id_related = db.Column(db.Integer, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('Users.user_id'))  # 关联 Users 表
-    upload_time = db.Column(db.DateTime, default=db.func.current_timestamp())  # 默认当前时间
+    upload_time = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)  # 默认当前时间，列表按其分页
@@ -7,8 +7,24 @@ from .file_management import bp as file_management_bp
 from .data_management import bp as data_management_bp
 from .diagnosis import bp as diagnosis_bp
 from .report import bp as report_bp
+from .jobs import bp as jobs_bp
+from .statistics import bp as statistics_bp
+from .artifacts import bp as artifacts_bp
+from .metrics import bp as metrics_bp, init_metrics
+from .profiling import bp as profiling_bp
+from .auth_context import load_current_user
+from .write_behind import install_sigterm_handler
 
 def init_app(app):
+    # 请求耗时统计，最先开始计时
+    init_metrics(app)
+
+    # 每个请求开始时解析登录用户
+    app.before_request(load_current_user)
+
+    # 正常停止时写完延迟写入的登录时间
+    install_sigterm_handler()
+
     # 不设置前缀，直接注册蓝图
     app.register_blueprint(auth_bp)  # 不设置前缀
     app.register_blueprint(model_management_bp)
@@ -17,3 +33,8 @@ def init_app(app):
     app.register_blueprint(data_management_bp)
     app.register_blueprint(diagnosis_bp)
     app.register_blueprint(report_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(statistics_bp)
+    app.register_blueprint(artifacts_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(profiling_bp)
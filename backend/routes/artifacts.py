@@ -0,0 +1,90 @@
+# artifacts.py
+# 报告与图像文件的统一下载入口：支持 Range 断点续传和强 ETag 条件请求；
+# 文件名带唯一 ID 的产物内容不会再变化，返回长期缓存头。可选交给 nginx（X-Accel-Redirect）或 Apache（X-Sendfile）发送文件。
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from flask import Blueprint, current_app, jsonify, request
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+from config import Config
+
+bp = Blueprint('artifacts', __name__)
+
+# 文件名带唯一 ID 的产物：诊断产物使用 32 位 uuid，PDF 报告以 8 位 uuid 前缀结尾
+IMMUTABLE_NAME = re.compile(r'[0-9a-f]{32}|_[0-9a-f]{8}\.pdf$')
+
+
+def is_immutable(path):
+    return bool(IMMUTABLE_NAME.search(os.path.basename(path)))
+
+
+def _accel_path(path):
+    # 只有 REPORT_DIR 下的文件才能通过 nginx 的 internal location 访问
+    root = os.path.realpath(Config.REPORT_DIR)
+    real_path = os.path.realpath(path)
+    if os.path.commonpath([root, real_path]) != root:
+        return None
+    relative = os.path.relpath(real_path, root).replace(os.sep, '/')
+    return f"{Config.ARTIFACT_ACCEL_PREFIX.rstrip('/')}/{quote(relative)}"
+
+
+def send_artifact(path, mimetype=None, download_name=None, as_attachment=False):
+    """
+    发送报告或图像文件
+    :param path: 文件路径
+    :param mimetype: 为空时按扩展名推断
+    :param download_name: 下载时的文件名
+    :param as_attachment: 是否作为附件下载
+    :raise FileNotFoundError: 文件不存在
+    """
+    stat = os.stat(path)
+    mimetype = mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    # 文件先写临时文件再替换，大小和修改时间即可唯一确定内容
+    etag = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    immutable = is_immutable(path)
+    max_age = Config.ARTIFACT_CACHE_MAX_AGE if immutable else 0
+
+    accel_path = _accel_path(path) if Config.ARTIFACT_SENDFILE == 'x-accel-redirect' else None
+    if accel_path is not None:
+        # 由 nginx 发送文件并处理 Range，这里只负责条件请求和响应头
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = accel_path
+        response.set_etag(etag)
+        response.last_modified = int(stat.st_mtime)
+        if download_name or as_attachment:
+            disposition = 'attachment' if as_attachment else 'inline'
+            response.headers['Content-Disposition'] = \
+                f"{disposition}; filename*=UTF-8''{quote(download_name or os.path.basename(path))}"
+        response = response.make_conditional(request)
+    else:
+        response = send_file(path, request.environ, mimetype=mimetype, as_attachment=as_attachment,
+                             download_name=download_name, conditional=True, etag=etag,
+                             last_modified=stat.st_mtime, max_age=max_age,
+                             use_x_sendfile=Config.ARTIFACT_SENDFILE == 'x-sendfile',
+                             response_class=current_app.response_class)
+
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = Config.ARTIFACT_CACHE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # 早期共用文件名的产物会被覆盖，每次都要用 ETag 重新验证
+        response.cache_control.no_cache = True
+    return response
+
+
+# 报告、混淆矩阵等 REPORT_DIR 下的文件
+@bp.route('/reports/<path:filename>', methods=['GET'])
+def serve_report(filename):
+    path = safe_join(Config.REPORT_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        return jsonify(message="File not found"), 404
+    try:
+        return send_artifact(path)
+    except FileNotFoundError:
+        # 检查之后文件被删除
+        return jsonify(message="File not found"), 404
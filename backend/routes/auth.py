@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.security import check_password_hash
+from werkzeug.security import check_password_hash, generate_password_hash
 from models import db, User
-import jwt
-from datetime import datetime, timedelta
+from .pagination import invalidate_count
+from .write_behind import last_login_buffer
+from .auth_context import issue_token
+from datetime import datetime
 
 # 创建蓝图
 auth_bp = Blueprint('auth', __name__)
@@ -24,19 +26,10 @@ def login():
         if not check_password_hash(user.password_hash, password):  # 使用加密的密码哈希进行比较
             return jsonify({"error": "无效的密码"}), 401
 
-        user.last_login = datetime.utcnow()
-        db.session.commit()
-
-        token = jwt.encode(
-            {
-                'username': username,
-                'exp': datetime.utcnow() + timedelta(hours=1)
-            },
-            'your_secret_key',
-            algorithm='HS256'
-        )
+        # 登录时间由后台线程合并后批量写入
+        last_login_buffer.put(user.user_id, last_login=datetime.utcnow())
 
-        token = token.decode('utf-8')
+        token = issue_token(username)
 
         return jsonify({"message": "登录成功", "token": token}), 200
 
@@ -69,6 +62,7 @@ def register():
 
         db.session.add(new_user)
         db.session.commit()
+        invalidate_count('Users')
         return jsonify({"message": "Registration successful"}), 200
 
     except Exception as e:
@@ -0,0 +1,188 @@
+# auth_context.py
+# 请求级的身份认证：每个请求最多校验一次 Authorization 中的 JWT，结果放在 g.current_user 中。
+# 校验通过的 token 按摘要缓存一段时间（不超过 token 的过期时间），同一个 token 的后续请求既不重复验签也不再查询 Users 表。
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+
+import jwt
+from flask import g, jsonify, request
+
+from config import Config
+from models import User
+
+
+# 当前请求的登录用户，只保存鉴权需要的字段，可以跨请求缓存
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    user_id: int
+    username: str
+    role: str
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+
+class AuthError(Exception):
+    """token 缺失、无效、过期或用户不存在"""
+
+
+class TokenCache:
+    """
+    已校验 token 的 LRU 缓存：token 摘要 -> (登录用户, 过期时间)
+    :param max_size: 最大条数
+    :param ttl: 缓存时间，单位为秒
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[digest]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(digest)
+            return entry[0]
+
+    def hit_ratio(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return self.hits / lookups if lookups else 0.0
+
+    def put(self, digest, user, token_exp=None):
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._entries[digest] = (user, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard_user(self, user_id):
+        # 用户被删除后立即让其 token 失效
+        with self._lock:
+            for digest in [d for d, (user, _) in self._entries.items() if user.user_id == user_id]:
+                del self._entries[digest]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(Config.AUTH_CACHE_SIZE, Config.AUTH_CACHE_TTL)
+
+# AUTH_REQUIRED 开启时也不需要 token 的接口：登录、注册，以及通过 <img> 等标签直接加载的静态文件；
+# /metrics 的抓取 token 不是 JWT，由接口自行鉴权
+PUBLIC_ENDPOINTS = {'auth.login', 'auth.register', 'index', 'artifacts.serve_report', 'report.get_embedding_image',
+                    'metrics.metrics'}
+
+
+# 签发登录 token
+def issue_token(username):
+    token = jwt.encode({'username': username, 'exp': int(time.time()) + Config.JWT_EXPIRES_IN},
+                       Config.JWT_SECRET_KEY, algorithm=Config.JWT_ALGORITHM)
+    # PyJWT 1.x 返回 bytes，2.x 返回 str
+    return token.decode('utf-8') if isinstance(token, bytes) else token
+
+
+def bearer_token():
+    # 与前端约定为 "Bearer <token>"，不校验前缀的写法
+    _, _, token = request.headers.get('Authorization', '').strip().partition(' ')
+    return token.strip() or None
+
+
+def authenticate(token):
+    """
+    校验 token 并返回登录用户，优先使用缓存
+    :raise AuthError: token 无效、过期或用户不存在
+    """
+    digest = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    user = token_cache.get(digest)
+    if user is not None:
+        return user
+
+    try:
+        payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=[Config.JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise AuthError('token 已过期')
+    except jwt.InvalidTokenError:
+        raise AuthError('无效的 token')
+
+    username = payload.get('username')
+    if not username:
+        raise AuthError('无效的 token')
+    row = User.query.with_entities(User.user_id, User.username, User.role).filter_by(username=username).first()
+    if row is None:
+        raise AuthError('用户不存在')
+
+    user = AuthenticatedUser(row.user_id, row.username, row.role)
+    token_cache.put(digest, user, payload.get('exp'))
+    return user
+
+
+# 每个请求开始时解析一次登录用户，结果放在 g.current_user，失败原因放在 g.auth_error
+def load_current_user():
+    g.current_user = None
+    g.auth_error = None
+    if request.method == 'OPTIONS':
+        return None
+
+    token = bearer_token()
+    if token is None:
+        g.auth_error = '用户未登录'
+    else:
+        try:
+            g.current_user = authenticate(token)
+        except AuthError as e:
+            g.auth_error = str(e)
+
+    if Config.AUTH_REQUIRED and g.current_user is None and request.endpoint not in PUBLIC_ENDPOINTS:
+        return jsonify({'error': g.auth_error}), 401
+    return None
+
+
+# 要求登录的接口
+def login_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if g.get('current_user') is None:
+            return jsonify({'error': g.get('auth_error') or '用户未登录'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# 当前用户不是管理员时返回错误响应，否则返回 None；用于只有部分参数需要管理员权限的接口
+def admin_error():
+    user = g.get('current_user')
+    if user is None:
+        return jsonify({'error': g.get('auth_error') or '用户未登录'}), 401
+    if not user.is_admin:
+        return jsonify({'error': '需要管理员权限'}), 403
+    return None
+
+
+# 要求管理员权限的接口
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        error = admin_error()
+        if error is not None:
+            return error
+        return view(*args, **kwargs)
+    return wrapper
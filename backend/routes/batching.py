@@ -0,0 +1,143 @@
+# batching.py
+# 推理进程内的动态微批调度：同一模型的多个并发诊断请求把各自的窗口提交到同一个队列，
+# 由该模型的调度线程合并成更大的批次统一前向计算，再把输出按来源拆分返回。
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import torch
+
+
+class _ModelQueue:
+    def __init__(self, model):
+        self.model = model
+        self.pending = deque()  # (输入张量, Future)
+        self.sessions = 0  # 正在使用该模型的请求数
+        self.condition = threading.Condition()
+        self.thread = None
+
+
+class BatchScheduler:
+    """
+    动态微批调度器
+    :param max_batch_size: 合并后的最大批量
+    :param max_delay: 等待其他请求凑批的最长时间，单位为秒
+    :param idle_timeout: 调度线程空闲多久后退出，单位为秒
+    """
+
+    def __init__(self, max_batch_size, max_delay, idle_timeout=30.0):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.idle_timeout = idle_timeout
+        self._queues = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.merged_rows = 0
+
+    def _queue_for(self, model):
+        # 队列以模型对象区分：缓存中的同一个模型对象共享一个队列
+        with self._lock:
+            model_queue = self._queues.get(id(model))
+            if model_queue is None:
+                model_queue = _ModelQueue(model)
+                self._queues[id(model)] = model_queue
+            if model_queue.thread is None:
+                model_queue.thread = threading.Thread(target=self._loop, args=(model_queue,),
+                                                      name='batch-scheduler', daemon=True)
+                model_queue.thread.start()
+            return model_queue
+
+    def _acquire(self, model):
+        # 返回已持有 condition 且调度线程仍在运行的队列
+        while True:
+            model_queue = self._queue_for(model)
+            model_queue.condition.acquire()
+            if model_queue.thread is not None:
+                return model_queue
+            model_queue.condition.release()
+
+    @contextmanager
+    def session(self, model):
+        """
+        标记一个请求正在使用该模型；只有一个请求时不必等待凑批
+        """
+        model_queue = self._acquire(model)
+        model_queue.sessions += 1
+        model_queue.condition.release()
+        try:
+            yield
+        finally:
+            with model_queue.condition:
+                model_queue.sessions -= 1
+                model_queue.condition.notify()
+
+    def infer(self, model, inputs):
+        """
+        提交一批窗口并等待对应的模型输出
+        :param model: 已加载的模型
+        :param inputs: 输入张量，第一维为窗口数
+        :return: 该批窗口的模型输出
+        """
+        future = Future()
+        model_queue = self._acquire(model)
+        model_queue.pending.append((inputs, future))
+        model_queue.condition.notify()
+        model_queue.condition.release()
+        return future.result()
+
+    def _take_batch(self, model_queue):
+        # 调用时已持有 condition；返回 None 表示空闲超时，应退出线程
+        idle_deadline = time.monotonic() + self.idle_timeout
+        while not model_queue.pending:
+            remaining = idle_deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            model_queue.condition.wait(remaining)
+
+        # 等到所有活跃请求都提交了窗口、批次已满或超过最长等待时间
+        deadline = time.monotonic() + self.max_delay
+        while True:
+            rows = sum(item[0].shape[0] for item in model_queue.pending)
+            if rows >= self.max_batch_size or len(model_queue.pending) >= model_queue.sessions:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            model_queue.condition.wait(remaining)
+
+        batch = [model_queue.pending.popleft()]
+        rows = batch[0][0].shape[0]
+        while model_queue.pending and rows + model_queue.pending[0][0].shape[0] <= self.max_batch_size:
+            item = model_queue.pending.popleft()
+            batch.append(item)
+            rows += item[0].shape[0]
+        return batch
+
+    def _loop(self, model_queue):
+        while True:
+            with model_queue.condition:
+                batch = self._take_batch(model_queue)
+                if batch is None:
+                    with self._lock:
+                        # 没有待处理窗口且没有活跃请求时才退出
+                        if not model_queue.pending and model_queue.sessions == 0:
+                            model_queue.thread = None
+                            self._queues.pop(id(model_queue.model), None)
+                            return
+                    continue
+
+            try:
+                inputs = [item[0] for item in batch]
+                with torch.no_grad():
+                    outputs = model_queue.model(torch.cat(inputs) if len(inputs) > 1 else inputs[0])
+                self.batches += 1
+                self.merged_rows += outputs.shape[0]
+                # 按提交顺序把输出拆回各自的请求
+                for (_, future), chunk in zip(batch, torch.split(outputs, [x.shape[0] for x in inputs])):
+                    future.set_result(chunk)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
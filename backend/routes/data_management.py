@@ -1,20 +1,26 @@
 # data_management.py
 from flask import Blueprint, jsonify
 from models import DataManagement, db
+from .pagination import paginate, PaginationError
+from .response_cache import cached_response
 
 bp = Blueprint('data_management', __name__)
 
 # 获取所有数据上传记录
 @bp.route('/data_management', methods=['GET'])
+@cached_response('Data_Management')
 def get_data_records():
     try:
-        data_records = DataManagement.query.all()
+        query = db.session.query(DataManagement.data_id, DataManagement.data_type, DataManagement.upload_time)
+        data_records, meta = paginate(query, DataManagement.upload_time, DataManagement.data_id, 'Data_Management')
         records_list = [{
             "id": record.data_id,  # 这里确保 data_id 是模型的字段
             "name": record.data_type,  # 确保 data_type 是正确的字段
             "uploadedAt": record.upload_time.isoformat()  # 统一格式化时间
         } for record in data_records]
-        return jsonify({"dataRecords": records_list}), 200
+        return jsonify({"dataRecords": records_list, **meta}), 200
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Error fetching data records: {str(e)}"}), 500
 
@@ -0,0 +1,170 @@
+# dataset_cache.py
+# 测试数据集的解析与二进制缓存：上传的 zip 只在第一次诊断时解析一次，
+# 转换为按 SHA-256 命名的 float32 特征文件和 int64 标签文件，之后通过 np.memmap 零拷贝打开。
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+# 每个样本窗口的形状：1024 个时间步，13 个通道
+WINDOW_SHAPE = (1024, 13)
+WINDOW_SIZE = WINDOW_SHAPE[0] * WINDOW_SHAPE[1]
+DATASET_MEMBER = 'test_dataset.csv'
+# 缓存格式版本，格式变化时旧缓存自动失效
+CACHE_VERSION = 1
+
+
+class DatasetFormatError(ValueError):
+    """测试数据 CSV 的结构不符合要求"""
+
+
+# 在 zip 中查找数据集 CSV
+def _find_dataset_member(zipf):
+    for info in zipf.infolist():
+        if os.path.basename(info.filename) == DATASET_MEMBER:
+            return info
+    raise FileNotFoundError(f"未找到 CSV 文件：{DATASET_MEMBER}")
+
+
+# 流式统计 CSV 的数据行数（不含表头），用于预先分配内存
+def _count_rows(zipf, member):
+    lines = 0
+    last = b''
+    with zipf.open(member) as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            lines += chunk.count(b'\n')
+            last = chunk
+    # 最后一行没有换行符
+    if last and not last.endswith(b'\n'):
+        lines += 1
+    return max(lines - 1, 0)
+
+
+# 分块解析 CSV，typed=True 时直接按 float32 解析，否则逐块强制转换为数值
+def _iter_chunks(zipf, member, typed):
+    with zipf.open(member) as f:
+        if typed:
+            reader = pd.read_csv(f, chunksize=Config.DATASET_CSV_CHUNK_ROWS, dtype=np.float32)
+        else:
+            reader = pd.read_csv(f, chunksize=Config.DATASET_CSV_CHUNK_ROWS, low_memory=False)
+        for chunk in reader:
+            if not typed:
+                # 将无法转换为数字的值设置为 NaN
+                chunk = chunk.apply(pd.to_numeric, errors='coerce')
+            yield chunk.to_numpy(dtype=np.float32, copy=False)
+
+
+def _fill_buffers(zipf, member, features, labels, typed):
+    row = 0
+    for values in _iter_chunks(zipf, member, typed):
+        if values.shape[1] != WINDOW_SIZE + 1:
+            raise DatasetFormatError(f"CSV 每行应有 {WINDOW_SIZE + 1} 列，实际为 {values.shape[1]} 列")
+        count = values.shape[0]
+        if row + count > features.shape[0]:
+            raise DatasetFormatError("CSV 行数与预先统计的不一致")
+        # 缺失值填充为 0
+        values[np.isnan(values)] = 0
+        features[row:row + count] = values[:, :-1]  # 除了最后一列，作为特征数据
+        labels[row:row + count] = values[:, -1]  # 最后一列作为标签
+        row += count
+    return row
+
+
+# 解析 zip 中的 CSV，写入调用方分配的缓冲区
+def parse_zip_dataset(file_path, allocate):
+    """
+    流式读取 zip 中的 CSV：先统计行数，由 allocate(rows) 一次性分配缓冲区，再分块解析填充
+    :param file_path: zip 文件路径
+    :param allocate: allocate(rows) 返回 (features, labels) 缓冲区，形状为 (rows, WINDOW_SIZE) 与 (rows,)
+    :return: (features, labels, 实际行数)
+    """
+    with zipfile.ZipFile(file_path, 'r') as zipf:
+        member = _find_dataset_member(zipf)
+        features, labels = allocate(_count_rows(zipf, member))
+
+        try:
+            filled = _fill_buffers(zipf, member, features, labels, typed=True)
+        except DatasetFormatError:
+            raise
+        except ValueError:
+            # 存在非数值内容时退回逐块强制转换，保持与原来相同的处理方式
+            filled = _fill_buffers(zipf, member, features, labels, typed=False)
+    return features, labels, filled
+
+
+def _cache_dir(digest):
+    return os.path.join(Config.DATASET_CACHE_FOLDER, digest)
+
+
+def _open_cached(path):
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != CACHE_VERSION:
+        return None
+    rows = meta['rows']
+    # mode='c' 为写时复制映射：数组可写但不会写回文件，torch.from_numpy 可以直接使用而无需复制
+    features = np.memmap(os.path.join(path, 'features.f32'), dtype=np.float32, mode='c', shape=(rows, WINDOW_SIZE))
+    labels = np.memmap(os.path.join(path, 'labels.i64'), dtype=np.int64, mode='c', shape=(rows,))
+    return features, labels
+
+
+def _convert(file_path, path):
+    # 写到同目录下的临时目录，完成后整体重命名，其他进程不会看到写了一半的缓存
+    os.makedirs(Config.DATASET_CACHE_FOLDER, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=Config.DATASET_CACHE_FOLDER)
+    try:
+        def allocate(rows):
+            if rows == 0:
+                raise DatasetFormatError("数据集为空")
+            features = np.memmap(os.path.join(tmp_dir, 'features.f32'), dtype=np.float32, mode='w+',
+                                 shape=(rows, WINDOW_SIZE))
+            labels = np.memmap(os.path.join(tmp_dir, 'labels.i64'), dtype=np.int64, mode='w+', shape=(rows,))
+            return features, labels
+
+        features, labels, filled = parse_zip_dataset(file_path, allocate)
+        features.flush()
+        labels.flush()
+        del features, labels
+
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump({"version": CACHE_VERSION, "rows": filled, "window_shape": list(WINDOW_SHAPE)}, f)
+
+        try:
+            os.rename(tmp_dir, path)
+        except OSError:
+            # 其他进程已完成同一数据集的转换
+            if not os.path.exists(os.path.join(path, 'meta.json')):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# 打开缓存的数据集，不存在时先转换
+def open_dataset(file_path, digest):
+    """
+    :param file_path: 上传的 zip 文件路径
+    :param digest: zip 文件内容的 SHA-256
+    :return: (features, labels) 只读映射，features 形状为 (rows, WINDOW_SIZE)
+    """
+    path = _cache_dir(digest)
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        cached = _open_cached(path)
+        if cached is not None:
+            return cached
+        # 旧版本格式的缓存，删除后重新转换
+        shutil.rmtree(path, ignore_errors=True)
+
+    _convert(file_path, path)
+    return _open_cached(path)
+
+
+# 删除某个数据集的缓存
+def remove_dataset(digest):
+    if digest:
+        shutil.rmtree(_cache_dir(digest), ignore_errors=True)
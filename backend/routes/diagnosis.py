@@ -1,116 +1,202 @@
-from flask import Blueprint, request, jsonify, send_from_directory
-from fpdf import FPDF
+from flask import Blueprint, request, jsonify, current_app
 from models import File, Model, DiagnosisRecord, Report, db
-import subprocess
+from config import Config
+from .inference_pool import get_pool, WorkerError
+from .jobs import jobs
+from .model_management import resolve_inference_artifact, model_key
+from .file_management import dataset_key
+from .report import submit_embedding_render, schedule_report
+from .pagination import paginate, PaginationError
+from .statistics import set_record_metrics, add_to_rollups
+from .response_cache import cached_response, bump_version
+from .metrics import record_stages
+from .auth_context import admin_error
 import os
 import json
-import re
+import hashlib
+import time
+import uuid
 from datetime import datetime
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 bp = Blueprint('diagnosis', __name__)
 
-# 提供静态文件访问的路由
-@bp.route('/reports/<filename>')
-def serve_report(filename):
-    filepath = os.path.join('/root/My_Project/backend/reports', filename)
-    print(f"Serving file from: {filepath}")  # 打印文件路径
-    return send_from_directory('/root/My_Project/backend/reports', filename)
-
 # 获取文件列表
 @bp.route('/get_files', methods=['GET'])
+@cached_response('Files')
 def get_files():
     try:
-        files = File.query.all()
+        files, meta = paginate(db.session.query(File.file_id, File.file_name, File.upload_time),
+                               File.upload_time, File.file_id, 'Files')
         files_data = [{"file_id": file.file_id, "file_name": file.file_name} for file in files]
-        return jsonify(files=files_data), 200
+        return jsonify(files=files_data, **meta), 200
+    except PaginationError as e:
+        return jsonify(message=str(e)), 400
     except Exception as e:
         logger.error(f"Error fetching files: {str(e)}")
         return jsonify(message="Internal server error"), 500
 
 # 获取模型列表
 @bp.route('/get_models', methods=['GET'])
+@cached_response('Models')
 def get_models():
     try:
-        models = Model.query.all()
+        models, meta = paginate(db.session.query(Model.model_id, Model.model_name, Model.upload_time),
+                                Model.upload_time, Model.model_id, 'Models')
         models_data = [{"model_id": model.model_id, "model_name": model.model_name} for model in models]
-        return jsonify(models=models_data), 200
+        return jsonify(models=models_data, **meta), 200
+    except PaginationError as e:
+        return jsonify(message=str(e)), 400
     except Exception as e:
         logger.error(f"Error fetching models: {str(e)}")
         return jsonify(message="Internal server error"), 500
 
 
-# Generate PDF report
-import json
-from fpdf import FPDF
-import os
-
-def generate_report_pdf(diagnosis_record, report_path):
-    # Create PDF instance
-    pdf = FPDF()
-    pdf.add_page()
-
-    # Set title
-    pdf.set_font('Arial', 'B', 16)
-    pdf.cell(200, 10, txt="Diagnosis Report", ln=True, align='C')
-
-    # Set content
-    pdf.set_font('Arial', '', 12)
-    pdf.ln(10)  # Space
-    pdf.cell(200, 10, txt=f"Report Name: {diagnosis_record.report.report_name}", ln=True)  # Report name
-
-    # Get file name by file_id
-    file = File.query.get(diagnosis_record.file_id)
-    file_name = file.file_name if file else "Unknown File"
-    pdf.cell(200, 10, txt=f"File Name: {file_name}", ln=True)
-
-    # Get model name by model_id
-    model = Model.query.get(diagnosis_record.model_id)
-    model_name = model.model_name if model else "Unknown Model"
-    pdf.cell(200, 10, txt=f"Model Name: {model_name}", ln=True)
-
-    # Diagnosis result (formatting the metrics)
-    pdf.ln(10)  # Space
-    pdf.cell(200, 10, txt="Diagnosis Results:", ln=True)
-
-    # Check if diagnosis_result is a JSON string
-    try:
-        diagnosis_data = json.loads(diagnosis_record.diagnosis_result)  # Parse JSON string to dictionary
-    except json.JSONDecodeError:
-        diagnosis_data = {}
-
-    # Extracting and formatting the metrics
-    metrics = {
-        "Accuracy": diagnosis_data.get("accuracy", "N/A"),
-        "Precision": diagnosis_data.get("precision", "N/A"),
-        "Recall": diagnosis_data.get("recall", "N/A"),
-        "F1 Score": diagnosis_data.get("f1", "N/A"),
-        "Specificity": diagnosis_data.get("specificity", "N/A")
-    }
-
-    # Formatting the metrics to match the desired structure
-    pdf.ln(5)  # Space
-    for metric, value in metrics.items():
-        pdf.cell(200, 10, txt=f"{metric}: {value}", ln=True)
-
-    # Diagnosis time
-    diagnosis_time = diagnosis_record.created_at.strftime("%Y-%m-%d %H:%M:%S")
-    pdf.cell(200, 10, txt=f"Diagnosis Time: {diagnosis_time}", ln=True)
-
-    # Insert confusion matrix image
-    confusion_matrix_image_path = diagnosis_record.confusion_matrix_path
-    if os.path.exists(confusion_matrix_image_path):
-        pdf.ln(10)  # Space
-        pdf.image(confusion_matrix_image_path, x=10, w=180)  # Adjust image width
-    else:
-        logger.warning(f"Confusion matrix image not found: {confusion_matrix_image_path}")
-
-    # Save PDF file
-    pdf.output(report_path)
+# 诊断结果缓存键：数据文件和模型文件的内容哈希，加上实际使用的推理后端与精度模式
+def diagnosis_cache_key(file, model, backend, precision):
+    file_hash = dataset_key(file)
+    model_hash = model_key(model)
+    if not file_hash or not model_hash:
+        return None
+    return hashlib.sha256(f"{file_hash}:{model_hash}:{backend}:{precision}".encode()).hexdigest()
+
+
+# 查找输入未变化的最近一次诊断记录，图像和报告文件都还在（或报告仍在生成）时才复用
+def find_cached_diagnosis(cache_key):
+    if not cache_key:
+        return None
+    record = DiagnosisRecord.query.filter_by(cache_key=cache_key) \
+        .order_by(DiagnosisRecord.record_id.desc()).first()
+    if record is None or record.report is None or record.report.status == 'failed':
+        return None
+    paths = [record.embedding_path, record.confusion_matrix_path]
+    if record.report.status != 'pending':
+        paths.append(record.report.report_path)
+    if not all(path and os.path.exists(path) for path in paths):
+        return None
+    return record
+
+
+# 返回给前端的诊断结果
+def diagnosis_response(record, cached=False):
+    return dict(
+        record_id=record.record_id,
+        diagnosis_result=json.loads(record.diagnosis_result),
+        tsne_image_path=f"/diagnosis_records/{record.record_id}/tsne",  # 第一次访问时绘制
+        confusion_matrix_image_path=f"/reports/{os.path.basename(record.confusion_matrix_path)}",  # 返回相对路径
+        report_id=record.report_id,
+        report_status=(record.report.status or 'ready') if record.report else None,
+        profile_url=f"/diagnosis_records/{record.record_id}/profile" if record.profile_path else None,
+        cached=cached
+    )
+
+
+# 诊断流水线：推理进程池执行评估，随后保存诊断记录并生成报告
+def run_diagnosis_pipeline(file, model, file_path, model_path, progress=None, profile=False):
+    """
+    执行诊断并保存结果
+    :param file: File 记录
+    :param model: Model 记录
+    :param progress: 可选的进度回调 progress(stage, percent)
+    :param profile: 是否剖析本次诊断，结果保存在 PROFILE_DIR 下并关联到诊断记录
+    :return: 返回给前端的结果字典
+    """
+    # 选择推理后端：指定的后端或测得延迟最低的后端
+    model_path, backend, precision = resolve_inference_artifact(model, model_path)
+    cache_key = diagnosis_cache_key(file, model, backend, precision)
+    # 每次诊断的产物使用唯一的文件名，并发的诊断不会互相覆盖
+    artifact_id = uuid.uuid4().hex
+    confusion_matrix_image_path = os.path.join(Config.REPORT_DIR, f"{artifact_id}_confusion_matrix.png")
+    # 降维图所需的 logits 样本，降维和绘图推迟到第一次查看时
+    embedding_path = os.path.join(Config.REPORT_DIR, f"{artifact_id}.npz")
+    profile_path = os.path.join(Config.PROFILE_DIR, artifact_id) if profile else None
+
+    # 交给常驻推理进程池执行诊断；同一模型的请求优先交给同一个 worker，以便合并批次
+    future = get_pool().submit('diagnose', affinity=os.path.realpath(model_path), on_progress=progress,
+                               file_path=file_path, model_path=model_path, backend=backend,
+                               precision=precision, dataset_key=dataset_key(file), sample_path=embedding_path,
+                               confusion_matrix_path=confusion_matrix_image_path, profile_path=profile_path)
+    submitted = time.perf_counter()
+    result = future.result(timeout=Config.INFERENCE_TASK_TIMEOUT)
+
+    # worker 内各阶段耗时，剩余部分为排队和进程间传输
+    timings = dict(result.timings)
+    timings['queue_wait'] = max(time.perf_counter() - submitted - sum(timings.values()), 0.0)
+
+    diagnosis_data = result.to_dict()
+    diagnosis_data.pop('timings', None)
+    diagnosis_data.pop('profile', None)
+    diagnosis_result = json.dumps(diagnosis_data)  # 原始 JSON 字符串
+
+    # 延迟格式化：DEBUG 未开启或被采样丢弃时不构造消息
+    logger.debug("Parsed diagnosis result: %s", diagnosis_data)
+
+    if progress:
+        progress('report', 0)
+
+    # 创建报告名称
+    report_name = f"{model.model_name}_{file.file_name}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+
+    # 保存诊断记录
+    diagnosis_record = DiagnosisRecord(
+        file_id=file.file_id,
+        model_id=model.model_id,
+        confusion_matrix_path=confusion_matrix_image_path,
+        embedding_path=embedding_path,
+        profile_path=profile_path,
+        diagnosis_result=diagnosis_result,
+        cache_key=cache_key
+    )
+    set_record_metrics(diagnosis_record, diagnosis_data)
+    db.session.add(diagnosis_record)
+    commit_start = time.perf_counter()
+    db.session.commit()
+    commit_time = time.perf_counter() - commit_start
+
+    report_path = os.path.join(Config.REPORT_DIR, f"{report_name}_{artifact_id[:8]}.pdf")
+    # 创建并保存报告
+    report = Report(
+        report_name=report_name,
+        report_format="PDF",  # 假设格式为 PDF
+        report_path=report_path,
+        status='pending',
+        created_at=diagnosis_record.created_at
+    )
+    db.session.add(report)
+    # 关联报告和诊断记录
+    diagnosis_record.report = report
+    # 累加到统计汇总表，与报告一起提交
+    add_to_rollups(diagnosis_record)
+    commit_start = time.perf_counter()
+    db.session.commit()
+    timings['db_commit'] = commit_time + time.perf_counter() - commit_start
+    bump_version('Diagnosis_Records', 'Reports')
+    record_stages(timings)
+
+    # 在后台生成PDF报告，状态记录在 Report.status 上
+    schedule_report(diagnosis_record, report, file.file_name, model.model_name)
+
+    if progress:
+        progress('report', 100)
+
+    if Config.EMBEDDING_PRECOMPUTE:
+        submit_embedding_render(embedding_path)
+
+    return diagnosis_response(diagnosis_record)
+
+
+# 在后台线程中执行的异步诊断任务
+def _run_diagnosis_job(job_id, app, file_id, model_id, file_path, model_path, profile=False):
+    with app.app_context():
+        try:
+            file = File.query.get(file_id)
+            model = Model.query.get(model_id)
+            return run_diagnosis_pipeline(file, model, file_path, model_path, progress=jobs.progress(job_id),
+                                          profile=profile)
+        finally:
+            db.session.remove()
 
 
 # 执行故障诊断
@@ -125,6 +211,13 @@ def diagnose():
         if not file_id or not model_id:
             return jsonify(message="File ID and Model ID are required"), 400
 
+        # 剖析只对管理员开放
+        profile = bool(data.get('profile'))
+        if profile:
+            error = admin_error()
+            if error is not None:
+                return error
+
         # 查询数据库获取文件和模型路径
         file = File.query.get(file_id)
         model = Model.query.get(model_id)
@@ -134,97 +227,32 @@ def diagnose():
         if not model:
             return jsonify(message="Model not found in database"), 404
 
-        file_path = os.path.join("/root/My_Project/backend/uploads", file.file_name)
-        model_path = os.path.join("/root/My_Project/backend/models", model.model_name)
+        file_path = os.path.join(Config.BASE_DIR, "uploads", file.file_name)
+        model_path = os.path.join(Config.BASE_DIR, "models", model.model_name)
 
         if not os.path.exists(file_path):
             return jsonify(message=f"File not found on server at {file_path}"), 404
         if not os.path.exists(model_path):
             return jsonify(message=f"Model not found on server at {model_path}"), 404
 
-        # 执行诊断脚本
-        result = subprocess.run(
-            ["python3", "/root/My_Project/backend/routes/diagnosis_eval.py", file_path, model_path],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-
-        # 打印脚本输出和错误输出
-        logger.debug(f"Diagnosis script output: {result.stdout}")
-        logger.debug(f"Diagnosis script error: {result.stderr}")
-
-        # 使用正则表达式提取JSON部分
-        match = re.search(r'diagnosis_result-eval\s*(\{.*\})', result.stdout)
-        if match:
-            diagnosis_json = match.group(1)
-            try:
-                # 解析JSON内容
-                diagnosis_data = json.loads(diagnosis_json)
-            except json.JSONDecodeError:
-                logger.error(f"Failed to parse diagnosis script output: {result.stdout}")
-                return jsonify(message="Invalid output from diagnosis script, not in JSON format"), 500
-        else:
-            logger.error(f"Failed to find JSON in diagnosis script output: {result.stdout}")
-            return jsonify(message="Diagnosis result JSON not found in output"), 500
-
-        # 获取诊断结果详细信息
-        diagnosis_result = diagnosis_json  # 原始 JSON 字符串
-
-        logger.debug(f"Parsed diagnosis result: {diagnosis_data}")
-
-        # 图像路径
-        tsne_image_path = "/root/My_Project/backend/reports/t-SNE_Visualization.png"
-        confusion_matrix_image_path = "/root/My_Project/backend/reports/Confusion_Matrix.png"
-
-        # 转换为相对路径
-        tsne_image_url = f"/reports/{os.path.basename(tsne_image_path)}"
-        confusion_matrix_image_url = f"/reports/{os.path.basename(confusion_matrix_image_path)}"
-
-        # 创建报告名称
-        report_name = f"{model.model_name}_{file.file_name}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
-
-        # 保存诊断记录
-        diagnosis_record = DiagnosisRecord(
-            file_id=file_id,
-            model_id=model_id,
-            tsne_path=tsne_image_path,
-            confusion_matrix_path=confusion_matrix_image_path,
-            diagnosis_result=diagnosis_result
-        )
-        db.session.add(diagnosis_record)
-        db.session.commit()
-        
-        report_path=f"/root/My_Project/backend/reports/{report_name}.pdf"
-        # 转换为相对路径
-        # report_path_url = f"/reports/{os.path.basename(report_path)}"
-        # 创建并保存报告
-        report = Report(
-            report_name=report_name,
-            report_format="PDF",  # 假设格式为 PDF
-            report_path=report_path,
-            created_at=diagnosis_record.created_at
-        )
-        db.session.add(report)
-        db.session.commit()
-
-        # 关联报告和诊断记录
-        diagnosis_record.report = report
-        db.session.commit()
-
-        # 生成PDF报告
-        report_path = report.report_path
-        generate_report_pdf(diagnosis_record, report_path)
-
-        return jsonify(
-            diagnosis_result=diagnosis_data,
-            tsne_image_path=tsne_image_url,  # 返回相对路径
-            confusion_matrix_image_path=confusion_matrix_image_url,  # 返回相对路径
-        ), 200
-
-
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Subprocess error: {e.stderr}")
+        # 数据和模型都未变化时直接返回已有的诊断结果，force 为真或开启剖析时重新诊断
+        if not data.get('force') and not profile:
+            _, backend, precision = resolve_inference_artifact(model, model_path)
+            record = find_cached_diagnosis(diagnosis_cache_key(file, model, backend, precision))
+            if record is not None:
+                return jsonify(**diagnosis_response(record, cached=True)), 200
+
+        # 默认异步执行：立即返回任务 ID，进度通过 Socket.IO 推送或 GET /jobs/<id> 轮询，不占用请求线程；
+        # async 为 false 时在请求中等待诊断完成
+        if data.get('async', True):
+            job = jobs.submit('diagnosis', _run_diagnosis_job, current_app._get_current_object(),
+                              file.file_id, model.model_id, file_path, model_path, profile)
+            return jsonify(job_id=job.job_id, status_url=f"/jobs/{job.job_id}"), 202
+
+        return jsonify(**run_diagnosis_pipeline(file, model, file_path, model_path, profile=profile)), 200
+
+    except WorkerError as e:
+        logger.error(f"Diagnosis worker error: {str(e)}")
         return jsonify(message="Diagnosis script error", error=str(e)), 500
     except Exception as e:
         logger.error(f"Error: {str(e)}")
@@ -1,21 +1,28 @@
 # diagnosis_eval.py
 import sys
 import os
-import zipfile
-import pandas as pd
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
-import seaborn as sns
-import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix
-from sklearn.manifold import TSNE
+from torch.utils.data import Dataset
 import numpy as np
 from tqdm import tqdm
 import math
 import json
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+
+from config import Config
+from .model_cache import ModelCache
+from .batching import BatchScheduler
+from .inference_backends import load_backend
+from .eval_metrics import StreamingMetrics
+from .visualization import render_confusion_matrix, save_embedding_sample
+from .dataset_cache import WINDOW_SHAPE, WINDOW_SIZE, open_dataset, parse_zip_dataset
+from .profiling import ProfileSession
 
 # 自定义数据集类
 class CustomDataset(Dataset):
@@ -30,69 +37,72 @@ class CustomDataset(Dataset):
         return self.data[idx], self.labels[idx]
 
 
+# 按连续切片批量读取数据集，避免逐条取样再拼接
+class BatchLoader:
+    def __init__(self, data, labels, batch_size):
+        self.data = data
+        self.labels = labels
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return math.ceil(len(self.data) / self.batch_size)
+
+    def __iter__(self):
+        for start in range(0, len(self.data), self.batch_size):
+            end = start + self.batch_size
+            yield self.data[start:end], self.labels[start:end]
+
+
 # 从 zip 文件中恢复 test_dataset
 def load_test_dataset_from_zip(file_path):
     """
-    从 zip 文件解压并读取 CSV 文件，然后恢复数据集
-    :param zip_file_name: zip 文件路径
+    直接从 zip 中流式读取 CSV 并恢复数据集，不解压到磁盘
+    先统计行数并一次性分配 float32 缓冲区，再分块解析填充，峰值内存接近最终张量大小
+    :param file_path: zip 文件路径
     :return: CustomDataset 实例
     """
-    # 检查temp_data目录是否存在，不存在就创建
-    temp_dir = './temp_data'
-    os.makedirs(temp_dir, exist_ok=True)  # 确保临时目录存在
-
-    # 解压文件
-    with zipfile.ZipFile(file_path, 'r') as zipf:
-        zipf.extractall(temp_dir)
-
-    # 打印解压后的文件列表，帮助调试
-    extracted_files = os.listdir(temp_dir)
-    print(f"解压后的文件列表：{extracted_files}")
-
-    # 假设 CSV 文件名为 test_data1.csv，如果文件名不同，请修改
-    csv_file = os.path.join(temp_dir, 'test_dataset.csv')
-    
-    if not os.path.exists(csv_file):
-        raise FileNotFoundError(f"未找到 CSV 文件：{csv_file}")
-        
-    df = pd.read_csv(csv_file)
+    def allocate(rows):
+        return np.empty((rows, WINDOW_SIZE), dtype=np.float32), np.empty(rows, dtype=np.int64)
 
-    # 确保数据没有非数值列，强制转换为数值类型
-    df = df.apply(pd.to_numeric, errors='coerce')  # 将无法转换为数字的值设置为 NaN
+    features, labels, filled = parse_zip_dataset(file_path, allocate)
 
-    # 处理缺失值：可以选择填充或删除
-    df = df.fillna(0)  # 选择填充 NaN 值为 0，也可以选择删除 df.dropna()
-
-    # 提取数据和标签
-    data = df.iloc[:, :-1].values  # 除了最后一列，作为特征数据
-    labels = df.iloc[:, -1].values  # 最后一列作为标签
-
-    # 清理临时解压文件
-    os.remove(csv_file)
-
-    # 将数据转换为 torch tensor
-    data = torch.tensor(data, dtype=torch.float32)
-    labels = torch.tensor(labels, dtype=torch.long)
-
-    # 将数据重塑为 (963, 1024, 13) 的形状
-    data = data.reshape(-1, 1024, 13)  # 恢复数据的形状
+    # 空行会被 pandas 跳过，截掉多分配的部分（视图，不复制）
+    data = torch.from_numpy(features[:filled]).view(-1, *WINDOW_SHAPE)
+    labels = torch.from_numpy(labels[:filled])
     print("恢复后的数据形状:", data.shape)
     print("恢复后的标签形状:", labels.shape)
 
     return CustomDataset(data, labels)
 
 
+# 从二进制缓存中打开 test_dataset
+def load_cached_test_dataset(file_path, dataset_key):
+    """
+    第一次使用时把 zip 转换为二进制缓存，之后直接内存映射，不再解析 CSV
+    :param file_path: zip 文件路径
+    :param dataset_key: zip 文件内容的 SHA-256
+    :return: CustomDataset 实例，张量与映射文件共享内存
+    """
+    features, labels = open_dataset(file_path, dataset_key)
+    data = torch.from_numpy(features).view(-1, *WINDOW_SHAPE)
+    labels = torch.from_numpy(labels)
+    return CustomDataset(data, labels)
+
+
 # 生成 test_loader 数据加载器
-def get_test_loader(file_path, batch_size):
+def get_test_loader(file_path, batch_size, dataset_key=None):
     """
     生成测试数据加载器
     :param zip_file_name: zip 文件路径
     :param batch_size: 批量大小
-    :return: DataLoader 对象
+    :param dataset_key: zip 文件内容的 SHA-256，提供时使用二进制缓存
+    :return: BatchLoader 对象
     """
-    test_dataset = load_test_dataset_from_zip(file_path)
-    test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False)
-    return test_loader
+    if dataset_key and Config.DATASET_CACHE_ENABLED:
+        test_dataset = load_cached_test_dataset(file_path, dataset_key)
+    else:
+        test_dataset = load_test_dataset_from_zip(file_path)
+    return BatchLoader(test_dataset.data, test_dataset.labels, batch_size)
 
 
 class LinearAttention(nn.Module):
@@ -232,100 +242,200 @@ class ConvLF_Net(nn.Module):
         return x
 
 
-# 模型评估函数
-def eval_model(test_loader, model_path):
+# 常驻 worker 进程中已加载的模型
+model_cache = ModelCache(Config.MODEL_CACHE_MAX_BYTES, Config.MODEL_CACHE_KEY)
+# 合并同一模型并发请求的前向计算
+batch_scheduler = BatchScheduler(Config.INFERENCE_MAX_BATCH_SIZE, Config.INFERENCE_MAX_QUEUE_DELAY)
+
+
+# 加载模型，命中缓存时直接复用
+def load_model(model_path, device, backend='pytorch', precision='fp32'):
     """
-    评估模型并生成评估指标和可视化结果
-    :param test_loader: DataLoader 对象
+    加载模型
     :param model_path: 模型文件路径
-    :return: 混淆矩阵、准确率、精确率、召回率、F1 分数、特异性
+    :param device: 目标设备
+    :param backend: 推理后端名，见 inference_backends.BACKENDS
+    :param precision: 推理精度模式，见 inference_backends.PRECISION_MODES
+    :return: 可直接调用的推理后端对象
     """
-      # 根据设备的可用性选择 CUDA 或 CPU
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-    # 创建模型
-    model = ConvLF_Net().to(device)
-    # 加载模型权重，并指定加载到当前设备
-    model.load_state_dict(torch.load(model_path, map_location=device))
-    print("[Info]: Finish loading model!", flush=True)
-
-    label_total = []
-    preds = []
-    test_acc = 0.0
-    final_outputs = []
-
-    model.eval()
-    test_pbar = tqdm(test_loader, position=0, leave=True)
-    with torch.no_grad():
-        for data, labels in test_pbar:
-            data = data.float().to(device)
-            outputs = model(data)
-            _, test_pred = torch.max(outputs, 1)
-            preds.append(test_pred.cpu().detach())
-
-            labels = labels.to(device)
-            label_total.append(labels.cpu().detach())
+    def loader():
+        model = load_backend(backend, model_path, device, precision)
+        print(f"[Info]: Finish loading model with {backend} backend ({precision})!", flush=True)
+        return model
 
-            final_outputs.append(outputs.cpu().detach())
+    return model_cache.get_or_load(model_path, loader, variant=(backend, precision, str(device)))
 
-            test_acc += (test_pred == labels).float().mean().item()
 
-        print("Test Accuracy:", test_acc / len(test_loader))
+# 删除或替换模型文件后清除缓存
+def invalidate_model(model_path):
+    return model_cache.invalidate(model_path)
 
-    # 计算混淆矩阵
-    conf_matrix = confusion_matrix(torch.cat(label_total).numpy(), torch.cat(preds).numpy())
 
-    # 计算每个类的TP、FN、FP、TN
-    num_classes = conf_matrix.shape[0]
-    tp = np.diag(conf_matrix)  # True Positives for each class
-    fn = np.sum(conf_matrix, axis=1) - tp  # False Negatives for each class
-    fp = np.sum(conf_matrix, axis=0) - tp  # False Positives for each class
-    tn = np.sum(conf_matrix) - (fp + fn + tp)  # True Negatives for each class
+def model_cache_stats():
+    return model_cache.stats()
 
-    # 计算准确率、精确率、召回率、F1 分数和特异性
-    accuracy = np.sum(tp) / np.sum(conf_matrix)
-    precision = np.mean(tp / (tp + fp))  # Precision
-    recall = np.mean(tp / (tp + fn))  # Recall
-    f1 = 2 * (precision * recall) / (precision + recall)  # F1 Score
-    specificity = np.mean(tn / (tn + fp))  # Specificity
 
-    print(f"Accuracy: {accuracy:.4f}")
-    print(f"Precision: {precision:.4f}")
-    print(f"Recall: {recall:.4f}")
-    print(f"F1 Score: {f1:.4f}")
-    print(f"Specificity: {specificity:.4f}")
+# 累加 with 块的耗时到 timings[stage]，单位为秒
+@contextmanager
+def stage_timer(timings, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
 
-    # t-SNE 可视化
-    final_outputs = torch.cat(final_outputs)
-    X_embedded = TSNE(n_components=2, random_state=42).fit_transform(final_outputs.numpy())
 
-    unique_labels = np.unique(torch.cat(label_total).numpy())
-    palette = sns.color_palette("Set1", n_colors=len(unique_labels))
+# 模型评估函数
+def eval_model(test_loader, model_path, progress=None, backend='pytorch', precision='fp32', sample_path=None,
+               confusion_matrix_path=None, timings=None, profiler=None):
+    """
+    评估模型并生成评估指标和可视化结果
+    :param test_loader: BatchLoader 对象
+    :param model_path: 模型文件路径
+    :param progress: 可选的进度回调 progress(stage, percent)
+    :param backend: 推理后端名，见 load_model
+    :param precision: 推理精度模式，见 load_model
+    :param sample_path: 可选的 logits 样本保存路径，用于之后绘制降维图
+    :param confusion_matrix_path: 可选的混淆矩阵图保存路径
+    :param timings: 可选的字典，累加 model_load / inference / metrics / plot_render 各阶段耗时
+    :param profiler: 可选的 ProfileSession，提供时用 torch.profiler 记录前向计算
+    :return: 准确率、精确率、召回率、F1 分数、特异性以及各类别指标的字典
+    """
+    progress = progress or _no_progress
+    timings = {} if timings is None else timings
+    # 根据设备的可用性选择 CUDA 或 CPU
+    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    with stage_timer(timings, 'model_load'):
+        model = load_model(model_path, device, backend, precision)
 
-    plt.figure(figsize=(15, 6))
+    metrics = StreamingMetrics(sample_size=Config.EVAL_LOGIT_SAMPLE_SIZE)
 
-    # 绘制 t-SNE 映射结果
-    plt.subplot(1, 2, 1)
-    plt.tick_params(axis='both', which='both', bottom=False, top=False, left=False, right=False, labelbottom=False,
-                    labelleft=False)
-    sns.scatterplot(x=X_embedded[:, 0], y=X_embedded[:, 1], hue=torch.cat(label_total).numpy(), palette=palette,
-                    legend='full')
-    plt.title("t-SNE Visualization")
-    plt.savefig("/root/My_Project/backend/reports/t-SNE_Visualization.png")
+    test_pbar = tqdm(test_loader, position=0, leave=True)
+    num_batches = len(test_loader)
+    last_percent = -1
+    progress('inference', 0)
+    # 剖析时绕过批调度器，在当前线程直接执行前向计算，trace 中只有本次诊断的批次
+    session = nullcontext() if profiler else batch_scheduler.session(model)
+    forward_trace = profiler.trace_forward() if profiler else nullcontext()
+    with stage_timer(timings, 'inference'), torch.no_grad(), session, forward_trace as step:
+        for batch_index, (data, labels) in enumerate(test_pbar):
+            data = data.float().to(device)
+            if profiler:
+                outputs = model(data)
+                step()
+            else:
+                outputs = batch_scheduler.infer(model, data)
+            # 只在设备上累加，不逐批同步
+            metrics.update(outputs, labels)
+
+            percent = int((batch_index + 1) * 100 / num_batches)
+            if percent != last_percent:
+                progress('inference', percent)
+                last_percent = percent
+
+    progress('metrics', 0)
+    # 由累加的混淆矩阵计算准确率、精确率、召回率、F1 分数和特异性
+    with stage_timer(timings, 'metrics'):
+        result = metrics.compute()
+        conf_matrix, classes = metrics.confusion_matrix()
+
+    print(f"Accuracy: {result['accuracy']:.4f}")
+    print(f"Precision: {result['precision']:.4f}")
+    print(f"Recall: {result['recall']:.4f}")
+    print(f"F1 Score: {result['f1']:.4f}")
+    print(f"Specificity: {result['specificity']:.4f}")
+
+    progress('metrics', 100)
+
+    progress('visualization', 0)
+    with stage_timer(timings, 'plot_render'):
+        # 降维图在第一次查看时才计算，这里只保存 logits 样本
+        if sample_path:
+            sample_outputs, sample_labels = metrics.sample()
+            save_embedding_sample(sample_path, sample_outputs.numpy(), sample_labels.numpy())
+
+        # 绘制混淆矩阵
+        if confusion_matrix_path:
+            render_confusion_matrix(conf_matrix, classes, confusion_matrix_path)
+    progress('visualization', 100)
+
+    return result
+
+
+def _no_progress(stage, percent=100):
+    pass
+
+
+# 每个诊断任务独立的临时工作目录，任务结束或失败时自动删除
+@contextmanager
+def job_workspace():
+    os.makedirs(Config.WORKSPACE_ROOT, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='job-', dir=Config.WORKSPACE_ROOT) as workspace:
+        yield workspace
+
+
+# 推理进程池中的诊断任务
+def run_diagnosis(file_path, model_path, batch_size=32, progress=None, backend='pytorch', precision='fp32',
+                  dataset_key=None, sample_path=None, confusion_matrix_path=None, profile_path=None):
+    """
+    执行一次完整的诊断
+    :param file_path: 测试数据 zip 文件路径
+    :param model_path: 模型文件路径
+    :param batch_size: 批量大小
+    :param progress: 可选的进度回调 progress(stage, percent)
+    :param backend: 推理后端名，见 load_model
+    :param precision: 推理精度模式，见 load_model
+    :param dataset_key: 数据文件内容的 SHA-256，提供时使用二进制数据集缓存
+    :param sample_path: 可选的 logits 样本保存路径，用于之后绘制降维图
+    :param confusion_matrix_path: 可选的混淆矩阵图保存路径
+    :param profile_path: 可选的剖析结果目录，提供时剖析整个诊断过程
+    :return: 诊断指标字典，timings 中为各阶段耗时，开启剖析时 profile 中为剖析摘要
+    """
+    if not profile_path:
+        return _run_diagnosis(file_path, model_path, batch_size, progress, backend, precision, dataset_key,
+                              sample_path, confusion_matrix_path)
 
-    # 绘制混淆矩阵
-    plt.subplot(1, 2, 2)
-    sns.heatmap(conf_matrix, annot=True, fmt="d", cmap="Blues", cbar=True)
-    plt.xlabel('Predicted labels')
-    plt.ylabel('True labels')
-    plt.savefig("/root/My_Project/backend/reports/Confusion_Matrix.png")
+    try:
+        with ProfileSession(profile_path) as profiler:
+            result = _run_diagnosis(file_path, model_path, batch_size, progress, backend, precision, dataset_key,
+                                    sample_path, confusion_matrix_path, profiler)
+    except BaseException:
+        # 诊断失败时不会创建诊断记录，剖析结果无处关联
+        shutil.rmtree(profile_path, ignore_errors=True)
+        raise
+    result['profile'] = profiler.summary
+    return result
+
+
+def _run_diagnosis(file_path, model_path, batch_size, progress, backend, precision, dataset_key, sample_path,
+                   confusion_matrix_path, profiler=None):
+    progress = progress or _no_progress
+    timings = {}
+
+    # 加载测试数据和模型
+    progress('data_load', 0)
+    with stage_timer(timings, 'zip_parse'):
+        test_loader = get_test_loader(file_path, batch_size=batch_size, dataset_key=dataset_key)
+    progress('data_load', 100)
+
+    # 产物先写入任务独立的临时目录，完成后再移动到最终路径，并发的诊断不会互相覆盖
+    with job_workspace() as workspace:
+        artifacts = {path: os.path.join(workspace, os.path.basename(path))
+                     for path in (sample_path, confusion_matrix_path) if path}
 
-    plt.show()
+        # 执行模型评估
+        result = eval_model(test_loader, model_path, progress, backend, precision, artifacts.get(sample_path),
+                            artifacts.get(confusion_matrix_path), timings, profiler)
 
-    return accuracy, precision, recall, f1, specificity
+        with stage_timer(timings, 'artifact_move'):
+            for final_path, scratch_path in artifacts.items():
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                shutil.move(scratch_path, final_path)
+    result['timings'] = timings
+    return result
 
 
-# 主函数入口
-# 其他导入和方法定义...
+# 主函数入口，便于在命令行单独调试：在 backend 目录下执行 python3 -m routes.diagnosis_eval <数据> <模型>
 if __name__ == "__main__":
     try:
         file_path = sys.argv[1]
@@ -333,30 +443,11 @@ if __name__ == "__main__":
 
         # 执行诊断并生成结果
         print("Starting model evaluation...")
-
-        # 加载测试数据和模型
-        test_loader = get_test_loader(file_path, batch_size=32)
-
-        # 执行模型评估
-        accuracy, precision, recall, f1, specificity = eval_model(test_loader, model_path)
-
-        # 设置诊断结果
-        diagnosis_result = {
-            "accuracy": accuracy,
-            "precision": precision,
-            "recall": recall,
-            "f1": f1,
-            "specificity": specificity
-        }
+        diagnosis_result = run_diagnosis(file_path, model_path)
 
         # 输出诊断结果为 JSON 格式
         print("diagnosis_result-eval",json.dumps(diagnosis_result))
 
-    except subprocess.CalledProcessError as e:
-        print(f"Subprocess error: {e.stderr}", file=sys.stderr)
-        print(json.dumps({"error": str(e)}), file=sys.stderr)
-        sys.exit(1)
-
     except Exception as e:
         # 输出错误到标准错误流
         print(f"Error: {str(e)}", file=sys.stderr)
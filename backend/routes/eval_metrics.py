@@ -0,0 +1,145 @@
+# eval_metrics.py
+# 流式评估指标：每批只在设备上累加混淆矩阵，并保留一个固定大小的 logits 水塘样本用于可视化，
+# 内存占用与测试集大小无关，整个评估过程只在最后同步一次设备。
+import numpy as np
+import torch
+
+
+# 安全除法：分母为 0 的位置结果为 0
+def _safe_divide(numerator, denominator):
+    numerator = numerator.astype(np.float64)
+    denominator = denominator.astype(np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator != 0)
+
+
+class StreamingMetrics:
+    """
+    流式累加混淆矩阵与 logits 样本
+    :param sample_size: 保留用于可视化的 logits 样本数
+    :param seed: 水塘抽样的随机种子
+    """
+
+    def __init__(self, sample_size=2000, seed=42):
+        self.sample_size = sample_size
+        self.seed = seed
+        self.num_classes = 0
+        self.matrix = None  # (真实类别, 预测类别) 计数
+        self.seen = 0
+        self.sample_logits = None
+        self.sample_labels = None
+        self._generator = None
+
+    def _grow(self, num_classes, device):
+        # 标签中出现超出模型输出维度的类别时扩展混淆矩阵
+        matrix = torch.zeros(num_classes, num_classes, dtype=torch.int64, device=device)
+        if self.matrix is not None:
+            matrix[:self.num_classes, :self.num_classes] = self.matrix
+        self.matrix = matrix
+        self.num_classes = num_classes
+
+    def update(self, outputs, labels):
+        """
+        累加一批模型输出
+        :param outputs: logits，形状为 (批量, 类别数)
+        :param labels: 真实标签，形状为 (批量,)，取值为从 0 开始的类别编号
+        :raise ValueError: 标签中有负数
+        """
+        outputs = outputs.detach()
+        preds = outputs.argmax(dim=1)
+
+        # 标签来自数据加载器，通常仍在 CPU 上，在移动到设备前检查标签范围和类别数不会触发设备同步
+        if labels.numel() and int(labels.min()) < 0:
+            raise ValueError(f"Labels must be non-negative class indices, got {int(labels.min())}")
+        num_classes = max(outputs.shape[1], int(labels.max()) + 1 if labels.numel() else 0)
+        if num_classes > self.num_classes:
+            self._grow(num_classes, outputs.device)
+        labels = labels.detach().to(outputs.device).long()
+
+        n = self.num_classes
+        counts = torch.bincount(labels * n + preds, minlength=n * n)
+        self.matrix += counts.view(n, n)
+
+        self._sample(outputs, labels)
+
+    def _sample(self, outputs, labels):
+        # 水塘抽样：第 i 个样本以 sample_size / i 的概率替换样本中的随机位置
+        batch = outputs.shape[0]
+        if self.sample_logits is None:
+            self.sample_logits = torch.empty(self.sample_size, outputs.shape[1], dtype=outputs.dtype,
+                                             device=outputs.device)
+            self.sample_labels = torch.empty(self.sample_size, dtype=torch.int64, device=outputs.device)
+            self._generator = torch.Generator(device=outputs.device).manual_seed(self.seed)
+
+        # 样本未满时直接追加
+        fill = min(max(self.sample_size - self.seen, 0), batch)
+        if fill:
+            self.sample_logits[self.seen:self.seen + fill] = outputs[:fill]
+            self.sample_labels[self.seen:self.seen + fill] = labels[:fill]
+
+        if fill < batch:
+            positions = torch.arange(self.seen + fill + 1, self.seen + batch + 1, device=outputs.device)
+            slots = (torch.rand(batch - fill, generator=self._generator, device=outputs.device)
+                     * positions).long()
+            keep = slots < self.sample_size
+            self.sample_logits[slots[keep]] = outputs[fill:][keep]
+            self.sample_labels[slots[keep]] = labels[fill:][keep]
+
+        self.seen += batch
+
+    def confusion_matrix(self):
+        """
+        :return: (混淆矩阵, 类别编号)，只包含真实标签或预测结果中出现过的类别
+        """
+        if self.matrix is None:
+            return np.zeros((0, 0), dtype=np.int64), np.zeros(0, dtype=np.int64)
+        matrix = self.matrix.cpu().numpy()
+        classes = np.flatnonzero(matrix.sum(axis=0) + matrix.sum(axis=1))
+        return matrix[np.ix_(classes, classes)], classes
+
+    def sample(self):
+        """
+        :return: (logits 样本, 对应的真实标签)，均为 CPU 张量
+        """
+        if self.sample_logits is None:
+            return torch.empty(0, 0), torch.empty(0, dtype=torch.int64)
+        count = min(self.seen, self.sample_size)
+        return self.sample_logits[:count].cpu(), self.sample_labels[:count].cpu()
+
+    def compute(self):
+        """
+        由混淆矩阵计算总体指标与各类别指标，精确率、召回率和特异性为出现过的类别的宏平均
+        :return: 指标字典
+        """
+        conf_matrix, classes = self.confusion_matrix()
+
+        # 计算每个类的TP、FN、FP、TN
+        tp = np.diag(conf_matrix)
+        fn = conf_matrix.sum(axis=1) - tp
+        fp = conf_matrix.sum(axis=0) - tp
+        tn = conf_matrix.sum() - (fp + fn + tp)
+
+        class_precision = _safe_divide(tp, tp + fp)
+        class_recall = _safe_divide(tp, tp + fn)
+        class_f1 = _safe_divide(2 * class_precision * class_recall, class_precision + class_recall)
+        class_specificity = _safe_divide(tn, tn + fp)
+
+        total = conf_matrix.sum()
+        precision = float(class_precision.mean()) if len(classes) else 0.0
+        recall = float(class_recall.mean()) if len(classes) else 0.0
+        denominator = precision + recall
+
+        return {
+            "accuracy": float(tp.sum() / total) if total else 0.0,
+            "precision": precision,
+            "recall": recall,
+            "f1": 2 * precision * recall / denominator if denominator else 0.0,
+            "specificity": float(class_specificity.mean()) if len(classes) else 0.0,
+            "per_class": [{
+                "label": int(label),
+                "support": int(tp[i] + fn[i]),
+                "precision": float(class_precision[i]),
+                "recall": float(class_recall[i]),
+                "f1": float(class_f1[i]),
+                "specificity": float(class_specificity[i])
+            } for i, label in enumerate(classes)]
+        }
@@ -0,0 +1,21 @@
+# events.py
+# Socket.IO 实例与事件处理，和 models 中的 db 一样先创建对象，再在 app.py 中绑定应用
+from flask_socketio import SocketIO, join_room, emit
+
+socketio = SocketIO()
+
+
+# 客户端订阅某个诊断任务的进度推送
+@socketio.on('subscribe_job')
+def subscribe_job(data):
+    from .jobs import jobs
+
+    job_id = (data or {}).get('job_id')
+    job = jobs.get(job_id)
+    if job is None:
+        emit('job_error', {'job_id': job_id, 'message': 'Job not found'})
+        return
+
+    join_room(job_id)
+    # 立即推送一次当前状态，避免订阅前的进度丢失
+    emit('diagnosis_progress', job.to_dict())
@@ -3,20 +3,28 @@ import os
 from flask import Blueprint, jsonify, request
 from werkzeug.utils import secure_filename
 from config import Config
-from models import db, File
+from models import db, File, DiagnosisRecord
+from .model_cache import file_sha256
+from .dataset_cache import remove_dataset
+from .pagination import paginate, PaginationError
+from .response_cache import cached_response, bump_version
 from datetime import datetime
 
 # 创建蓝图
 bp = Blueprint('file_management', __name__)
 
-# 设置日志
-logging.basicConfig(level=logging.DEBUG)
-
 # 检查文件扩展名是否合法
 def allowed_file(filename):
     allowed_extensions = {'dat', 'pt', 'zip', 'xlsx'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
+# 获取文件内容的 SHA-256，早于该字段上传的文件在第一次使用时补算
+def dataset_key(file):
+    if not file.content_hash and os.path.exists(file.file_path):
+        file.content_hash = file_sha256(file.file_path)
+        db.session.commit()
+    return file.content_hash
+
 # 上传文件接口
 @bp.route('/upload_file', methods=['POST'])
 def upload_file():
@@ -53,11 +61,14 @@ def upload_file():
             file_name=filename,
             file_size=file_size,
             file_path=file_path,
-            upload_time=datetime.utcnow()
+            upload_time=datetime.utcnow(),
+            content_hash=file_sha256(file_path)
         )
 
         db.session.add(new_file)
         db.session.commit()
+        # 数据管理列表记录文件的上传和删除
+        bump_version('Files', 'Data_Management')
 
         return jsonify({"message": "File uploaded successfully", "file_name": filename}), 200
 
@@ -65,22 +76,13 @@ def upload_file():
         logging.error(f"File upload failed: {str(e)}")
         return jsonify({"error": "File upload failed"}), 500
 
-# 获取文件列表接口
+# 获取文件列表接口：兼容 page / page_size，也支持 cursor / limit 游标分页
 @bp.route('/get_files', methods=['GET'])
+@cached_response('Files')
 def get_files():
     try:
-        # 获取分页参数
-        page = int(request.args.get('page', 1))
-        page_size = int(request.args.get('page_size', 5))
-
-        files_query = db.session.query(File).order_by(File.upload_time.desc())
-
-        # 分页查询
-        files = files_query.offset((page - 1) * page_size).limit(page_size).all()
-
-        # 获取总数据条数
-        total_files = files_query.count()
-        total_pages = (total_files + page_size - 1) // page_size
+        files_query = db.session.query(File.file_id, File.file_name, File.file_size, File.upload_time)
+        files, meta = paginate(files_query, File.upload_time, File.file_id, 'Files', default_page_size=5)
 
         file_data = [{
             'file_id': file.file_id,
@@ -89,13 +91,10 @@ def get_files():
             'upload_time': file.upload_time.isoformat()
         } for file in files]
 
-        return jsonify({
-            'files': file_data,
-            'total': total_files,
-            'total_pages': total_pages,
-            'current_page': page
-        })
+        return jsonify({'files': file_data, **meta})
 
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logging.error(f"Error fetching files: {str(e)}")
         return jsonify({"error": "Error fetching files"}), 500
@@ -112,8 +111,17 @@ def delete_file(file_id):
             os.remove(file_path)
 
         # 删除数据库中的记录
+        content_hash = file.content_hash
+        # 使用该文件的诊断结果不再复用
+        DiagnosisRecord.query.filter_by(file_id=file_id).update({'cache_key': None})
         db.session.delete(file)
         db.session.commit()
+        # 数据管理列表记录文件的上传和删除
+        bump_version('Files', 'Data_Management')
+
+        # 没有其他文件使用相同内容时，删除对应的二进制缓存
+        if content_hash and not File.query.filter_by(content_hash=content_hash).first():
+            remove_dataset(content_hash)
 
         return jsonify({"message": "File deleted successfully"}), 200
 
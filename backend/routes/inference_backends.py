@@ -0,0 +1,127 @@
+# inference_backends.py
+# 可插拔的推理后端：每个模型可选择 PyTorch eager、TorchScript 或 ONNX Runtime 执行推理。
+# 后端对象可直接调用：输入一批窗口张量，返回 logits 张量，因此可以直接交给模型缓存和微批调度器。
+import itertools
+import os
+from abc import ABC, abstractmethod
+
+import torch
+
+# 后端注册表：后端名 -> 后端类
+BACKENDS = {}
+
+
+def register_backend(name):
+    def decorator(cls):
+        cls.name = name
+        BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+# 推理精度模式
+PRECISION_MODES = ('fp32', 'int8', 'bf16')
+
+
+class InferenceBackend(ABC):
+    """
+    推理后端基类，子类必须实现 __call__
+    :param model_path: 模型文件路径
+    :param device: 目标设备
+    :param precision: 推理精度模式，见 PRECISION_MODES
+    """
+    name = None
+    # 后端支持的精度模式
+    precisions = ('fp32',)
+
+    def __init__(self, model_path, device, precision='fp32'):
+        if precision not in self.precisions:
+            raise ValueError(f"{self.name} backend does not support {precision} precision")
+        self.model_path = model_path
+        self.device = device
+        self.precision = precision
+
+    @abstractmethod
+    def __call__(self, inputs):
+        """输入一批窗口张量，返回 logits 张量"""
+
+    @property
+    def nbytes(self):
+        return os.path.getsize(self.model_path)
+
+
+@register_backend('pytorch')
+class TorchEagerBackend(InferenceBackend):
+    precisions = PRECISION_MODES
+
+    def __init__(self, model_path, device, precision='fp32'):
+        super().__init__(model_path, device, precision)
+        self.module = self.build_module(model_path, device)
+        if precision == 'int8':
+            # 动态 int8 量化所有 nn.Linear：投影层、注意力中的四个线性层、前馈层和分类器
+            quantization = getattr(torch, 'ao', torch).quantization
+            self.module = quantization.quantize_dynamic(self.module, {torch.nn.Linear}, dtype=torch.qint8)
+
+    @staticmethod
+    def build_module(model_path, device):
+        # 模型结构定义在 diagnosis_eval 中，而 diagnosis_eval 依赖本模块，这里延迟导入
+        from .diagnosis_eval import ConvLF_Net
+
+        # 创建模型
+        module = ConvLF_Net().to(device)
+        # 加载模型权重，并指定加载到当前设备
+        module.load_state_dict(torch.load(model_path, map_location=device))
+        module.eval()
+        return module
+
+    def __call__(self, inputs):
+        if self.precision == 'bf16':
+            with torch.autocast(device_type=self.device.type, dtype=torch.bfloat16):
+                return self.module(inputs).float()
+        return self.module(inputs)
+
+    @property
+    def nbytes(self):
+        tensors = itertools.chain(self.module.parameters(), self.module.buffers())
+        # 量化后的线性层权重不在 parameters 中，退回用文件大小估算
+        return sum(t.numel() * t.element_size() for t in tensors) or super().nbytes
+
+
+@register_backend('torchscript')
+class TorchScriptBackend(InferenceBackend):
+    def __init__(self, model_path, device, precision='fp32'):
+        super().__init__(model_path, device, precision)
+        self.module = torch.jit.load(model_path, map_location=device)
+
+    def __call__(self, inputs):
+        return self.module(inputs)
+
+
+@register_backend('onnxruntime')
+class OnnxRuntimeBackend(InferenceBackend):
+    def __init__(self, model_path, device, precision='fp32'):
+        super().__init__(model_path, device, precision)
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("onnxruntime is not installed, cannot use the onnxruntime backend")
+
+        options = ort.SessionOptions()
+        # 与 torch 使用相同的线程数，避免与同进程内的其他任务争抢 CPU
+        options.intra_op_num_threads = torch.get_num_threads()
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, inputs):
+        outputs = self.session.run(None, {self.input_name: inputs.detach().cpu().numpy()})[0]
+        return torch.from_numpy(outputs)
+
+
+# 创建指定后端的实例
+def load_backend(name, model_path, device, precision='fp32'):
+    backend_cls = BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(f"Unknown inference backend: {name}")
+    return backend_cls(model_path, device, precision)
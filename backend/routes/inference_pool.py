@@ -0,0 +1,399 @@
+# inference_pool.py
+# 常驻推理进程池：worker 进程启动时一次性导入 torch / pandas / sklearn 等依赖并缓存模型，
+# 之后通过结构化的队列消息接收任务、返回带类型的结果，替代每次诊断都启动一个新的 python3 子进程。
+import atexit
+import importlib
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+import traceback
+import zlib
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+# 进程间传递的任务消息
+@dataclass
+class Task:
+    task_id: int
+    name: str
+    payload: dict
+    report_progress: bool = False
+
+
+# worker 执行任务过程中上报的阶段进度
+@dataclass
+class Progress:
+    task_id: int
+    stage: str
+    percent: float
+
+
+# 进程间传递的任务结果消息
+@dataclass
+class TaskResult:
+    task_id: int
+    ok: bool
+    value: object = None
+    error: str = None
+    traceback: str = None
+    cache_stats: dict = None  # 任务结束时 worker 的模型缓存统计，/metrics 读取最近一次的值，无需另外向 worker 发送任务
+
+
+# 诊断任务的返回结果
+@dataclass
+class DiagnosisResult:
+    accuracy: float
+    precision: float
+    recall: float
+    f1: float
+    specificity: float
+    per_class: list = field(default_factory=list)  # 各类别的支持数、精确率、召回率、F1 分数和特异性
+    timings: dict = field(default_factory=dict)  # worker 内各阶段耗时，单位为秒，不保存到诊断记录
+    profile: dict = None  # 开启剖析时的内存峰值和生成的文件，不保存到诊断记录
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class WorkerError(RuntimeError):
+    """worker 进程内执行任务时抛出的异常"""
+
+
+class WorkerDied(WorkerError):
+    """任务执行过程中 worker 进程意外退出"""
+
+
+class WorkerTimeout(WorkerError):
+    """任务超过期限仍未返回结果"""
+
+
+# 设置 Future 的结果或异常；调用方可能已经取消了 Future，此时忽略，避免结果收集线程退出
+def _settle(future, value=None, error=None):
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+    except InvalidStateError:
+        pass
+
+
+# 任务注册表：任务名 -> (worker 端函数的导入路径, 结果类型)
+# worker 端函数返回普通 dict，由主进程转换为对应的结果类型，主进程因此无需导入 torch
+TASKS = {
+    'diagnose': ('routes.diagnosis_eval.run_diagnosis', DiagnosisResult),
+    'invalidate_model': ('routes.diagnosis_eval.invalidate_model', None),
+    'model_cache_stats': ('routes.diagnosis_eval.model_cache_stats', None),
+    'compile_model': ('routes.model_compile.compile_model', None),
+    'export_onnx': ('routes.model_compile.export_onnx', None),
+    'evaluate_precision': ('routes.model_compile.evaluate_precision', None),
+    'render_embedding': ('routes.visualization.render_embedding', None),
+    'render_report': ('routes.report_render.render_report', None),
+}
+
+# worker 端的模型缓存统计函数，每个任务结束时随结果一起返回
+CACHE_STATS = 'routes.diagnosis_eval.model_cache_stats'
+
+
+def _resolve(path):
+    module_name, func_name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _progress_reporter(task_id, result_queue):
+    def report(stage, percent=100):
+        result_queue.put(Progress(task_id, stage, float(percent)))
+    return report
+
+
+def _run_task(handler, task, result_queue, cache_stats):
+    payload = dict(task.payload)
+    if task.report_progress:
+        payload['progress'] = _progress_reporter(task.task_id, result_queue)
+    try:
+        value = handler(**payload)
+        result = TaskResult(task.task_id, True, value=value)
+    except Exception as e:
+        result = TaskResult(task.task_id, False, error=f"{type(e).__name__}: {e}",
+                            traceback=traceback.format_exc())
+    try:
+        result.cache_stats = cache_stats()
+    except Exception:
+        pass
+    result_queue.put(result)
+
+
+# worker 进程入口
+def _worker_main(index, task_queue, result_queue, torch_threads, concurrency):
+    # 必须在导入 torch 之前设置，才能限制 OpenMP/MKL 线程数
+    os.environ['OMP_NUM_THREADS'] = str(torch_threads)
+    os.environ['MKL_NUM_THREADS'] = str(torch_threads)
+
+    import torch
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+    # 预先导入所有任务函数，把导入开销留在启动阶段
+    handlers = {name: _resolve(path) for name, (path, _) in TASKS.items()}
+    cache_stats = _resolve(CACHE_STATS)
+
+    # 同一 worker 内并发执行多个任务，同一模型的前向计算由微批调度器合并
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f'inference-task-{index}')
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        executor.submit(_run_task, handlers[task.name], task, result_queue, cache_stats)
+    executor.shutdown(wait=True)
+
+
+class InferencePool:
+    """
+    推理进程池
+    :param size: worker 进程数
+    :param torch_threads: 每个 worker 内 torch 使用的线程数
+    :param concurrency: 每个 worker 内同时执行的任务数
+    """
+
+    def __init__(self, size, torch_threads, concurrency):
+        self.size = size
+        self.torch_threads = torch_threads
+        self.concurrency = concurrency
+        # 使用 spawn，避免 fork 复制主进程中的数据库连接和线程
+        self._ctx = mp.get_context('spawn')
+        self._result_queue = self._ctx.Queue()
+        self._task_queues = [None] * size
+        self._workers = [None] * size
+        self._cache_stats = [None] * size  # 各 worker 最近一次返回的模型缓存统计
+        self._pending = {}  # task_id -> (Future, 结果类型, worker 序号, 进度回调)
+        self._deadlines = {}  # task_id -> 期限（time.monotonic），超过后任务从 _pending 中移除
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._closed = False
+
+        for index in range(size):
+            self._start_worker(index)
+
+        self._collector = threading.Thread(target=self._collect, name='inference-pool-collector', daemon=True)
+        self._collector.start()
+
+    def _start_worker(self, index):
+        task_queue = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, task_queue, self._result_queue, self.torch_threads, self.concurrency),
+            name=f'inference-worker-{index}',
+            daemon=True
+        )
+        process.start()
+        self._task_queues[index] = task_queue
+        self._workers[index] = process
+        self._cache_stats[index] = None
+        logger.info(f"Inference worker {index} started (pid={process.pid})")
+
+    def _pick_worker(self, affinity):
+        # 指定了亲和键时优先交给同一个 worker，以便合并批次；该 worker 的并发已占满时改选待处理任务最少的 worker
+        load = [0] * self.size
+        for _, _, index, _ in self._pending.values():
+            load[index] += 1
+        if affinity is not None:
+            preferred = zlib.crc32(str(affinity).encode('utf-8')) % self.size
+            if load[preferred] < self.concurrency:
+                return preferred
+        return load.index(min(load))
+
+    def _dispatch(self, name, index, payload, timeout, on_progress=None):
+        future = Future()
+        task_id = next(self._ids)
+        self._pending[task_id] = (future, TASKS[name][1], index, on_progress)
+        self._deadlines[task_id] = time.monotonic() + (Config.INFERENCE_TASK_TIMEOUT if timeout is None else timeout)
+        # 调用方取消后不再计入 worker 的负载
+        future.add_done_callback(lambda f: f.cancelled() and self._forget(task_id))
+        self._task_queues[index].put(Task(task_id, name, payload, report_progress=on_progress is not None))
+        return future
+
+    def _forget(self, task_id):
+        with self._lock:
+            self._pending.pop(task_id, None)
+            self._deadlines.pop(task_id, None)
+
+    def submit(self, name, affinity=None, on_progress=None, timeout=None, **payload):
+        """
+        提交任务
+        :param name: TASKS 中注册的任务名
+        :param affinity: 亲和键，相同的键优先交给同一个 worker
+        :param on_progress: 进度回调 on_progress(stage, percent)，在结果收集线程中调用
+        :param timeout: 任务期限，单位为秒，默认 INFERENCE_TASK_TIMEOUT；超过后 Future 以 WorkerTimeout 结束
+        :return: Future，结果为 TASKS 中登记的结果类型
+        """
+        if name not in TASKS:
+            raise ValueError(f"Unknown inference task: {name}")
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Inference pool is shut down")
+            return self._dispatch(name, self._pick_worker(affinity), payload, timeout, on_progress)
+
+    def broadcast(self, name, timeout=None, **payload):
+        """
+        向每个 worker 发送同一个任务，例如清除模型缓存
+        :param timeout: 任务期限，单位为秒，默认 INFERENCE_TASK_TIMEOUT
+        :return: 每个 worker 对应一个 Future 的列表
+        """
+        if name not in TASKS:
+            raise ValueError(f"Unknown inference task: {name}")
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Inference pool is shut down")
+            return [self._dispatch(name, index, payload, timeout) for index in range(self.size)]
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def worker_pids(self):
+        with self._lock:
+            return [process.pid for process in self._workers]
+
+    def cache_stats(self):
+        """
+        各 worker 最近一次完成任务时的模型缓存统计，尚未完成过任务的 worker 为 None
+        """
+        with self._lock:
+            return list(self._cache_stats)
+
+    def _collect(self):
+        last_check = time.monotonic()
+        while True:
+            if time.monotonic() - last_check > 1.0:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                message = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (OSError, EOFError, ValueError) as e:
+                # 解释器退出时 multiprocessing 可能先关闭了队列（已关闭的队列抛出 ValueError）
+                if self._closed:
+                    break
+                self._replace_result_queue(e)
+                continue
+            if message is None:
+                break
+
+            if isinstance(message, Progress):
+                self._notify_progress(message)
+                continue
+
+            with self._lock:
+                entry = self._pending.pop(message.task_id, None)
+                self._deadlines.pop(message.task_id, None)
+                if entry is not None and message.cache_stats is not None:
+                    self._cache_stats[entry[2]] = message.cache_stats
+            if entry is None:
+                continue
+
+            future, result_type, _, _ = entry
+            if message.ok:
+                value = message.value
+                if result_type is not None and isinstance(value, dict):
+                    value = result_type(**value)
+                _settle(future, value)
+            else:
+                logger.error(f"Inference task {message.task_id} failed: {message.traceback}")
+                _settle(future, error=WorkerError(message.error))
+
+    def _notify_progress(self, message):
+        with self._lock:
+            entry = self._pending.get(message.task_id)
+        if entry is None or entry[3] is None:
+            return
+        try:
+            entry[3](message.stage, message.percent)
+        except Exception as e:
+            logger.error(f"Progress callback for task {message.task_id} failed: {str(e)}")
+
+    def _check_workers(self):
+        # 重启意外退出的 worker，并让分配给它的任务失败，避免调用方一直等待
+        with self._lock:
+            if self._closed:
+                return
+            # 超过期限的任务：调用方已不再等待，从 _pending 中移除，不再计入负载和待处理任务数
+            now = time.monotonic()
+            for task_id in [task_id for task_id, deadline in self._deadlines.items() if deadline < now]:
+                del self._deadlines[task_id]
+                entry = self._pending.pop(task_id, None)
+                if entry is not None:
+                    logger.error(f"Inference task {task_id} timed out on worker {entry[2]}")
+                    _settle(entry[0], error=WorkerTimeout(f"Inference task {task_id} timed out"))
+            for index, process in enumerate(self._workers):
+                if process.is_alive():
+                    continue
+                logger.error(f"Inference worker {index} exited with code {process.exitcode}, restarting")
+                for task_id, (future, _, worker_index, _) in list(self._pending.items()):
+                    if worker_index == index:
+                        del self._pending[task_id]
+                        self._deadlines.pop(task_id, None)
+                        _settle(future, error=WorkerDied(f"Inference worker {index} died"))
+                self._start_worker(index)
+
+    def _replace_result_queue(self, error, timeout=5):
+        # 结果队列损坏后 worker 的结果无法送回：让待处理的任务失败，换一个新队列并重启所有 worker
+        logger.error(f"Inference result queue failed, restarting workers: {error}")
+        with self._lock:
+            if self._closed:
+                return
+            for future, _, _, _ in self._pending.values():
+                _settle(future, error=WorkerError(f"Inference result queue failed: {error}"))
+            self._pending.clear()
+            self._deadlines.clear()
+            self._result_queue = self._ctx.Queue()
+            for index, process in enumerate(self._workers):
+                process.terminate()
+                process.join(timeout)
+                self._start_worker(index)
+
+    def shutdown(self, timeout=5):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for task_queue in self._task_queues:
+            task_queue.put(None)
+        for process in self._workers:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._result_queue.put(None)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# 获取全局进程池，首次调用时才启动 worker；start=False 时进程池未启动则返回 None
+def get_pool(start=True):
+    global _pool
+    with _pool_lock:
+        if _pool is None and start:
+            _pool = InferencePool(Config.INFERENCE_POOL_SIZE, Config.INFERENCE_TORCH_THREADS,
+                                  Config.INFERENCE_WORKER_CONCURRENCY)
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+# 通知所有 worker 丢弃某个模型文件的缓存
+def invalidate_model(model_path):
+    pool = get_pool(start=False)
+    if pool is not None:
+        pool.broadcast('invalidate_model', model_path=os.path.realpath(model_path))
@@ -0,0 +1,116 @@
+# jobs.py
+# 异步诊断任务：POST /diagnose 立即返回任务 ID，阶段进度通过 Socket.IO 推送，也可通过 GET /jobs/<id> 轮询
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+import logging
+
+from flask import Blueprint, jsonify
+from config import Config
+from .events import socketio
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('jobs', __name__)
+
+
+@dataclass
+class Job:
+    job_id: str
+    kind: str
+    status: str = 'queued'  # queued / running / succeeded / failed
+    stage: str = None
+    progress: float = 0.0  # 当前阶段的完成百分比
+    result: dict = None
+    error: str = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class JobRegistry:
+    """
+    内存中的任务表，已结束的任务保留 ttl 秒后清理
+    """
+
+    def __init__(self, ttl, max_workers):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='diagnosis-job')
+
+    def _prune(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def counts(self):
+        """
+        各状态的任务数，queued 即等待执行的队列长度
+        """
+        counts = {'queued': 0, 'running': 0, 'succeeded': 0, 'failed': 0}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def submit(self, kind, fn, *args):
+        """
+        创建任务并在后台线程中执行 fn(job_id, *args)
+        :return: Job
+        """
+        job = Job(job_id=uuid.uuid4().hex, kind=kind)
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job.job_id, fn, args)
+        return job
+
+    def _run(self, job_id, fn, args):
+        self.update(job_id, status='running')
+        try:
+            result = fn(job_id, *args)
+            self.update(job_id, status='succeeded', progress=100.0, result=result, finished_at=time.time())
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            self.update(job_id, status='failed', error=str(e), finished_at=time.time())
+
+    def update(self, job_id, **changes):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            for key, value in changes.items():
+                setattr(job, key, value)
+            state = job.to_dict()
+        socketio.emit('diagnosis_progress', state, room=job_id)
+
+    def progress(self, job_id):
+        """
+        返回供推理进程池使用的进度回调
+        """
+        def report(stage, percent=100):
+            self.update(job_id, stage=stage, progress=float(percent))
+        return report
+
+
+jobs = JobRegistry(Config.JOB_TTL, Config.DIAGNOSIS_JOB_WORKERS)
+
+
+# 查询任务状态和结果
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(message="Job not found"), 404
+    return jsonify(job.to_dict()), 200
@@ -0,0 +1,223 @@
+# metrics.py
+# 运行指标：按 Prometheus 文本格式在 /metrics 输出各路由的请求数和延迟直方图、诊断各阶段耗时，
+# 以及队列长度、缓存命中率和进程内存等即时值。诊断等接口的阶段耗时同时通过 Server-Timing 响应头返回给浏览器。
+import bisect
+import hmac
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, g, has_request_context, request
+
+from config import Config
+from .auth_context import admin_error, bearer_token
+
+
+bp = Blueprint('metrics', __name__)
+
+# 请求延迟直方图的桶上限，单位为秒
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# 诊断阶段耗时直方图的桶上限，单位为秒
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    """
+    只增不减的计数器
+    :param name: 指标名
+    :param help_text: 说明
+    :param labels: 标签名
+    """
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    累积分桶的直方图
+    :param buckets: 各桶的上限，升序
+    """
+
+    def __init__(self, name, help_text, labels=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # 标签值 -> [各桶计数..., +Inf 计数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket"
+                             f"{_labels_text(self.labels + ('le',), label_values + (bound,))} {cumulative}")
+            labels = _labels_text(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def _gauge(name, help_text, samples):
+    # samples 为 [(标签字典, 值)]，值为 None 的样本跳过
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        if value is not None:
+            lines.append(f"{name}{_labels_text(tuple(labels), tuple(labels.values()))} {value}")
+    return lines
+
+
+http_requests = Counter('http_requests_total', 'HTTP requests by route, method and status',
+                        ('route', 'method', 'status'))
+http_latency = Histogram('http_request_duration_seconds', 'HTTP request latency by route and method',
+                         ('route', 'method'))
+stage_latency = Histogram('diagnosis_stage_duration_seconds', 'Diagnosis pipeline time by stage',
+                          ('stage',), buckets=STAGE_BUCKETS)
+
+
+def record_stage(stage, seconds):
+    """
+    记录诊断阶段耗时；在请求中调用时同时加入 Server-Timing 响应头
+    :param stage: 阶段名，例如 zip_parse / model_load / inference / pdf
+    :param seconds: 耗时，单位为秒
+    """
+    stage_latency.observe(seconds, stage)
+    if has_request_context():
+        g.setdefault('server_timing', []).append((stage, seconds))
+
+
+def record_stages(timings):
+    for stage, seconds in (timings or {}).items():
+        record_stage(stage, seconds)
+
+
+def rss_bytes(pid=None):
+    # 读取 /proc 中的常驻内存，非 Linux 系统返回 None
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+def _finish_timer(response):
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    # 路由模板作为标签，避免按具体 ID 产生大量时间序列
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_latency.observe(elapsed, route, request.method)
+    http_requests.inc(route, request.method, str(response.status_code))
+
+    timings = g.get('server_timing', [])
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings]
+    entries.append(f"total;dur={elapsed * 1000:.1f}")
+    response.headers['Server-Timing'] = ', '.join(entries)
+    return response
+
+
+def init_metrics(app):
+    app.before_request(_start_timer)
+    app.after_request(_finish_timer)
+
+
+def _runtime_gauges():
+    # 延迟导入，避免与各业务模块循环导入
+    from .inference_pool import get_pool
+    from .jobs import jobs
+    from .response_cache import response_cache
+    from .auth_context import token_cache
+    from .my_logging import log_queue_stats
+
+    lines = []
+    pool = get_pool(start=False)
+    lines += _gauge('inference_pool_pending_tasks', 'Tasks submitted to the inference pool and not finished',
+                    [({}, pool.pending_count() if pool else 0)])
+    lines += _gauge('diagnosis_jobs', 'Asynchronous diagnosis jobs by status',
+                    [({'status': status}, count) for status, count in sorted(jobs.counts().items())])
+
+    log_stats = log_queue_stats()
+    lines += _gauge('log_queue_depth', 'Log records waiting for the writer thread', [({}, log_stats.get('depth'))])
+    lines += _gauge('log_records_dropped', 'Log records dropped because the queue was full',
+                    [({}, log_stats.get('dropped'))])
+
+    lines += _gauge('cache_hit_ratio', 'Hit ratio of in-process caches', [
+        ({'cache': 'response'}, response_cache.hit_ratio()),
+        ({'cache': 'auth_token'}, token_cache.hit_ratio()),
+    ])
+
+    memory = [({'process': 'main', 'pid': os.getpid()}, rss_bytes())]
+    if pool is not None:
+        memory += [({'process': f'worker-{index}', 'pid': pid}, rss_bytes(pid))
+                   for index, pid in enumerate(pool.worker_pids())]
+        # 各 worker 的模型缓存命中率：取每个任务结果附带的最近一次统计，不向 worker 发送任务
+        lines += _gauge('worker_cache_hit_ratio',
+                        'Hit ratio of the model cache in each inference worker as of its last finished task',
+                        [({'cache': 'model', 'worker': index}, stats.get('hit_ratio'))
+                         for index, stats in enumerate(pool.cache_stats()) if stats])
+    lines += _gauge('process_resident_memory_bytes', 'Resident memory of the web and inference processes', memory)
+    return lines
+
+
+# Prometheus 抓取接口
+# /metrics 暴露 worker pid、内存和各路由流量，默认只对管理员和携带抓取 token 的 Prometheus 开放
+def _metrics_access_error():
+    if Config.METRICS_PUBLIC:
+        return None
+    token = bearer_token()
+    if Config.METRICS_SCRAPE_TOKEN and token and hmac.compare_digest(token, Config.METRICS_SCRAPE_TOKEN):
+        return None
+    return admin_error()
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    error = _metrics_access_error()
+    if error is not None:
+        return error
+    lines = http_requests.render() + http_latency.render() + stage_latency.render() + _runtime_gauges()
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,137 @@
+# model_cache.py
+# 推理进程内的已加载模型缓存：按模型文件身份（路径 + 修改时间/内容哈希）缓存，
+# 超出内存预算时按 LRU 淘汰，并记录命中、未命中、淘汰次数。
+import hashlib
+import itertools
+import os
+import threading
+from collections import OrderedDict
+
+
+# 估算模型占用的内存字节数（参数 + buffer）
+def estimate_nbytes(model):
+    if hasattr(model, 'nbytes'):
+        return int(model.nbytes)
+    if hasattr(model, 'parameters'):
+        tensors = itertools.chain(model.parameters(), model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    return 0
+
+
+# 计算文件的 SHA-256
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelCache:
+    """
+    LRU 模型缓存
+    :param max_bytes: 内存预算，单位为字节
+    :param key_mode: 'mtime' 使用修改时间和文件大小识别文件，'sha256' 使用内容哈希
+    """
+
+    def __init__(self, max_bytes, key_mode='mtime'):
+        self.max_bytes = max_bytes
+        self.key_mode = key_mode
+        self._entries = OrderedDict()  # key -> (model, nbytes)
+        self._hashes = {}  # (路径, 修改时间, 大小) -> 内容哈希，避免重复计算
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _identity(self, model_path):
+        path = os.path.realpath(model_path)
+        stat = os.stat(path)
+        if self.key_mode == 'sha256':
+            stat_key = (path, stat.st_mtime_ns, stat.st_size)
+            digest = self._hashes.get(stat_key)
+            if digest is None:
+                digest = file_sha256(path)
+                self._hashes[stat_key] = digest
+            return path, digest
+        return path, (stat.st_mtime_ns, stat.st_size)
+
+    def _remove(self, key):
+        _, nbytes = self._entries.pop(key)
+        self.current_bytes -= nbytes
+
+    def get_or_load(self, model_path, loader, variant=None):
+        """
+        获取缓存的模型，未命中时调用 loader 加载
+        :param model_path: 模型文件路径
+        :param loader: 无参函数，返回加载好的模型
+        :param variant: 同一文件的不同加载方式（如设备），作为键的一部分
+        :return: 模型对象
+        """
+        path, version = self._identity(model_path)
+        key = (path, version, variant)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        model = loader()
+        # 冻结后的 TorchScript 模型没有 parameters，退回用文件大小估算
+        nbytes = estimate_nbytes(model) or os.path.getsize(path)
+
+        with self._lock:
+            # 同一路径的旧版本文件已被替换，对应缓存失效
+            for old_key in [k for k in self._entries if k[0] == path and k[1] != version]:
+                self._remove(old_key)
+                self.invalidations += 1
+
+            # 超出整个预算的模型不缓存
+            if nbytes > self.max_bytes:
+                return model
+
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (model, nbytes)
+            self.current_bytes += nbytes
+
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return model
+
+    def invalidate(self, model_path):
+        """
+        移除某个模型文件的所有缓存
+        :param model_path: 模型文件路径
+        :return: 移除的条目数
+        """
+        path = os.path.realpath(model_path)
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == path]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            for stat_key in [k for k in self._hashes if k[0] == path]:
+                del self._hashes[stat_key]
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,184 @@
+# model_compile.py
+# 上传模型后的预编译：校验权重与 ConvLF_Net 的结构是否一致，
+# 生成冻结并去除 dropout 的 TorchScript 推理文件或 ONNX 文件，并对比 eager 与转换后的输出和推理延迟。
+import inspect
+import os
+import time
+
+import torch
+
+from config import Config
+from .diagnosis_eval import ConvLF_Net, get_test_loader
+from .inference_backends import OnnxRuntimeBackend, TorchEagerBackend
+
+
+class ModelShapeError(ValueError):
+    """模型权重与 ConvLF_Net 的结构不一致"""
+
+
+# 校验 state dict 与 ConvLF_Net 期望的参数名和形状
+def check_state_dict(state_dict):
+    expected = ConvLF_Net().state_dict()
+    problems = []
+    for name, tensor in expected.items():
+        if name not in state_dict:
+            problems.append(f"missing {name}")
+        elif tuple(state_dict[name].shape) != tuple(tensor.shape):
+            problems.append(f"{name}: expected {tuple(tensor.shape)}, got {tuple(state_dict[name].shape)}")
+    for name in state_dict:
+        if name not in expected:
+            problems.append(f"unexpected {name}")
+    if problems:
+        raise ModelShapeError("State dict does not match ConvLF_Net: " + "; ".join(problems[:10]))
+
+
+# 加载并校验上传的 state dict
+def load_eager_model(model_path):
+    state_dict = torch.load(model_path, map_location='cpu')
+    check_state_dict(state_dict)
+
+    model = ConvLF_Net()
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model
+
+
+# 比较两个模型在同一输入上的最大输出差异
+def max_output_diff(reference, candidate, example):
+    with torch.no_grad():
+        return (reference(example) - candidate(example)).abs().max().item()
+
+
+# 先写临时文件再替换，避免诊断读到写了一半的文件
+def _save_atomically(path, save):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+# 测量单批推理的中位延迟，单位为毫秒
+def measure_latency(model, example, runs):
+    with torch.no_grad():
+        # 预热，TorchScript 前几次调用会做图优化
+        for _ in range(3):
+            model(example)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            model(example)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+# 推理进程池中的预编译任务
+def compile_model(model_path, artifact_path):
+    """
+    生成 TorchScript 推理文件
+    :param model_path: 上传的 state dict 文件路径
+    :param artifact_path: 编译产物的保存路径
+    :return: 编译产物路径与 eager / 编译后的推理延迟
+    """
+    model = load_eager_model(model_path)
+
+    # eval 模式下脚本化再冻结，dropout 等训练期算子会在冻结优化中被移除
+    compiled = torch.jit.freeze(torch.jit.script(model))
+    if hasattr(torch.jit, 'optimize_for_inference'):
+        compiled = torch.jit.optimize_for_inference(compiled)
+
+    example = torch.randn(Config.MODEL_COMPILE_BENCHMARK_BATCH, 1024, 13)
+    max_diff = max_output_diff(model, compiled, example)
+    if max_diff > Config.MODEL_PARITY_TOLERANCE:
+        raise ValueError(f"Compiled model output differs from eager model by {max_diff}")
+
+    eager_latency = measure_latency(model, example, Config.MODEL_COMPILE_BENCHMARK_RUNS)
+    compiled_latency = measure_latency(compiled, example, Config.MODEL_COMPILE_BENCHMARK_RUNS)
+
+    _save_atomically(artifact_path, lambda path: torch.jit.save(compiled, path))
+
+    return {
+        "compiled_path": artifact_path,
+        "eager_latency_ms": eager_latency,
+        "compiled_latency_ms": compiled_latency
+    }
+
+
+# 推理进程池中的 ONNX 导出任务
+def export_onnx(model_path, onnx_path):
+    """
+    把上传的 state dict 导出为 ONNX，并用 ONNX Runtime 校验输出一致
+    :param model_path: 上传的 state dict 文件路径
+    :param onnx_path: ONNX 文件的保存路径
+    :return: ONNX 文件路径、最大输出差异与 eager / ONNX Runtime 的推理延迟
+    """
+    model = load_eager_model(model_path)
+    example = torch.randn(Config.MODEL_COMPILE_BENCHMARK_BATCH, 1024, 13)
+
+    def save(path):
+        kwargs = {}
+        # 新版本 torch 默认使用 dynamo 导出器，这里固定使用基于 TorchScript 的导出器
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            kwargs['dynamo'] = False
+        torch.onnx.export(model, (example,), path, input_names=['input'], output_names=['logits'],
+                          dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+                          opset_version=Config.ONNX_OPSET_VERSION, **kwargs)
+
+    _save_atomically(onnx_path, save)
+
+    # 使用与诊断相同的后端加载导出的文件做一致性校验
+    try:
+        backend = OnnxRuntimeBackend(onnx_path, torch.device('cpu'))
+        max_diff = max_output_diff(model, backend, example)
+        if max_diff > Config.MODEL_PARITY_TOLERANCE:
+            raise ValueError(f"ONNX model output differs from eager model by {max_diff}")
+    except Exception:
+        os.remove(onnx_path)
+        raise
+
+    return {
+        "onnx_path": onnx_path,
+        "max_abs_diff": max_diff,
+        "eager_latency_ms": measure_latency(model, example, Config.MODEL_COMPILE_BENCHMARK_RUNS),
+        "onnx_latency_ms": measure_latency(backend, example, Config.MODEL_COMPILE_BENCHMARK_RUNS)
+    }
+
+
+# 在数据集上统计准确率与前向计算总耗时
+def _accuracy_and_time(backend, test_loader):
+    correct = 0
+    total = 0
+    elapsed = 0.0
+    with torch.no_grad():
+        for data, labels in test_loader:
+            start = time.perf_counter()
+            outputs = backend(data.float())
+            elapsed += time.perf_counter() - start
+            correct += (outputs.argmax(dim=1) == labels).sum().item()
+            total += labels.shape[0]
+    return correct / total if total else 0.0, elapsed
+
+
+# 推理进程池中的精度模式评估任务
+def evaluate_precision(file_path, model_path, precision, dataset_key=None):
+    """
+    在上传的数据集上对比低精度模式与 fp32 的准确率和速度
+    :param file_path: 测试数据 zip 文件路径
+    :param model_path: 上传的 state dict 文件路径
+    :param precision: 待评估的精度模式，'int8' 或 'bf16'
+    :param dataset_key: 数据文件内容的 SHA-256，提供时使用二进制数据集缓存
+    :return: fp32 与该模式的准确率、准确率下降值和加速比
+    """
+    device = torch.device('cpu')
+    test_loader = get_test_loader(file_path, batch_size=32, dataset_key=dataset_key)
+
+    fp32_accuracy, fp32_time = _accuracy_and_time(TorchEagerBackend(model_path, device), test_loader)
+    accuracy, elapsed = _accuracy_and_time(TorchEagerBackend(model_path, device, precision), test_loader)
+
+    return {
+        "precision": precision,
+        "fp32_accuracy": fp32_accuracy,
+        "accuracy": accuracy,
+        "accuracy_drop": fp32_accuracy - accuracy,
+        "speedup": fp32_time / elapsed if elapsed else None
+    }
@@ -1,19 +1,143 @@
 import os
 import jwt
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 from werkzeug.utils import secure_filename
 from config import Config
-from models import db, Model
+from models import db, Model, File, DiagnosisRecord
+from .inference_pool import get_pool, invalidate_model
+from .file_management import dataset_key
+from .model_cache import file_sha256
+from .pagination import paginate, PaginationError
+from .response_cache import cached_response, bump_version
 from datetime import datetime
 from flask_cors import CORS
 
 # 创建蓝图
 bp = Blueprint('model_management', __name__)
 
+# 可选的推理后端与精度模式，与推理进程中 inference_backends 的定义一致
+INFERENCE_BACKENDS = {'pytorch', 'torchscript', 'onnxruntime'}
+PRECISION_MODES = {'fp32', 'int8', 'bf16'}
+
 # 检查文件扩展名是否合法
 def allowed_model(modelname):
-    allowed_extensions = {'h5', 'pt', 'zip', 'pkl'}  # 根据需求修改文件扩展名
-    return '.' in modelname and modelname.rsplit('.', 1)[1].lower() in allowed_extensions
+    return '.' in modelname and modelname.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
+
+# 获取模型文件内容的 SHA-256，早于该字段上传的模型在第一次使用时补算
+def model_key(model):
+    if not model.content_hash and os.path.exists(model.model_path):
+        model.content_hash = file_sha256(model.model_path)
+        db.session.commit()
+    return model.content_hash
+
+# 在推理进程池中执行模型的后台任务，完成后由 apply(model, result) 把结果写回 Model 记录
+# prefix 为状态字段前缀，例如 'compile' 对应 compile_status / compile_error；
+# current(model) 返回 False 时说明任务已被取代（例如评估期间已恢复 fp32），结果直接丢弃
+def schedule_model_task(task, model_id, prefix, output_path, apply, current=None, **payload):
+    app = current_app._get_current_object()
+    future = get_pool().submit(task, **payload)
+
+    def on_done(f):
+        with app.app_context():
+            try:
+                model = Model.query.get(model_id)
+                if model is None:
+                    # 执行期间模型已被删除
+                    if output_path and os.path.exists(output_path):
+                        os.remove(output_path)
+                    return
+                if current is not None and not current(model):
+                    return
+                try:
+                    # apply 可以返回 'ready' 以外的状态，例如评估未通过时的 'rejected'
+                    setattr(model, f'{prefix}_status', apply(model, f.result()) or 'ready')
+                except Exception as e:
+                    setattr(model, f'{prefix}_status', 'failed')
+                    setattr(model, f'{prefix}_error', str(e))
+                db.session.commit()
+                bump_version('Models')
+            except Exception as e:
+                print(f"Error saving {task} result for model {model_id}: {str(e)}")
+            finally:
+                db.session.remove()
+
+    future.add_done_callback(on_done)
+
+# 生成预编译的 TorchScript 推理文件
+def schedule_compile(model_id, model_path):
+    artifact_path = os.path.abspath(os.path.join(Config.COMPILED_MODEL_FOLDER, f"{model_id}.ts"))
+
+    def apply(model, result):
+        model.compiled_path = result['compiled_path']
+        model.eager_latency_ms = result['eager_latency_ms']
+        model.compiled_latency_ms = result['compiled_latency_ms']
+        model.compile_error = None
+
+    schedule_model_task('compile_model', model_id, 'compile', artifact_path, apply,
+                        model_path=os.path.abspath(model_path), artifact_path=artifact_path)
+
+# 导出 ONNX 并校验与 eager 模型的输出一致
+def schedule_onnx_export(model_id, model_path):
+    onnx_path = os.path.abspath(os.path.join(Config.COMPILED_MODEL_FOLDER, f"{model_id}.onnx"))
+
+    def apply(model, result):
+        model.onnx_path = result['onnx_path']
+        model.eager_latency_ms = result['eager_latency_ms']
+        model.onnx_latency_ms = result['onnx_latency_ms']
+        model.onnx_error = None
+
+    schedule_model_task('export_onnx', model_id, 'onnx', onnx_path, apply,
+                        model_path=os.path.abspath(model_path), onnx_path=onnx_path)
+
+# 在上传的数据集上评估低精度模式，准确率下降超过阈值时拒绝启用
+def schedule_precision_evaluation(model_id, model_path, file_path, precision, dataset_key=None):
+    def apply(model, result):
+        model.precision_fp32_accuracy = result['fp32_accuracy']
+        model.precision_accuracy = result['accuracy']
+        model.precision_speedup = result['speedup']
+        if result['accuracy_drop'] > Config.PRECISION_MAX_ACCURACY_DROP:
+            model.precision_error = (f"Accuracy drop {result['accuracy_drop']:.4f} exceeds "
+                                     f"threshold {Config.PRECISION_MAX_ACCURACY_DROP}")
+            return 'rejected'
+        model.precision_mode = precision
+        model.precision_error = None
+
+    schedule_model_task('evaluate_precision', model_id, 'precision', None, apply,
+                        current=lambda model: model.precision_candidate == precision, file_path=os.path.abspath(file_path), model_path=os.path.abspath(model_path),
+                        precision=precision, dataset_key=dataset_key)
+
+# 选择诊断使用的推理后端与模型文件
+def resolve_inference_artifact(model, model_path):
+    """
+    :param model: Model 记录
+    :param model_path: 上传的原始模型文件路径
+    :return: (模型文件路径, 后端名, 精度模式)
+    """
+    # 启用了低精度模式时使用 PyTorch eager 后端在加载时转换
+    if model.precision_mode in ('int8', 'bf16') and not model_path.lower().endswith('.onnx'):
+        return model_path, 'pytorch', model.precision_mode
+
+    artifacts = {}
+    if model_path.lower().endswith('.onnx'):
+        artifacts['onnxruntime'] = (model_path, model.onnx_latency_ms)
+    else:
+        artifacts['pytorch'] = (model_path, model.eager_latency_ms)
+    if model.compile_status == 'ready' and model.compiled_path and os.path.exists(model.compiled_path):
+        artifacts['torchscript'] = (model.compiled_path, model.compiled_latency_ms)
+    if model.onnx_status == 'ready' and model.onnx_path and os.path.exists(model.onnx_path):
+        artifacts['onnxruntime'] = (model.onnx_path, model.onnx_latency_ms)
+
+    # 显式指定了后端且对应文件可用
+    if model.backend in artifacts:
+        return artifacts[model.backend][0], model.backend, 'fp32'
+
+    # 否则选择测得延迟最低的后端
+    measured = [(latency, backend) for backend, (_, latency) in artifacts.items() if latency is not None]
+    if measured:
+        backend = min(measured)[1]
+    else:
+        backend = next(iter(artifacts))
+    return artifacts[backend][0], backend, 'fp32'
 
 # 上传模型接口
 @bp.route('/upload_model', methods=['POST'])
@@ -42,6 +166,8 @@ def upload_model():
 
         model_path = os.path.join(Config.UPLOAD_MODEL, filename)
         model.save(model_path)
+        # 同名文件被覆盖时，让推理进程丢弃旧模型
+        invalidate_model(model_path)
 
         # 获取文件大小
         model_size = os.path.getsize(model_path)
@@ -51,11 +177,31 @@ def upload_model():
             model_name=filename,
             model_size=model_size,
             model_path=model_path,
-            upload_time=datetime.utcnow()
+            upload_time=datetime.utcnow(),
+            content_hash=file_sha256(model_path)
         )
 
+        is_onnx = filename.lower().endswith('.onnx')
+        if is_onnx:
+            # 直接上传的 ONNX 模型使用 ONNX Runtime 推理
+            new_model.backend = 'onnxruntime'
+            new_model.onnx_path = os.path.abspath(model_path)
+            new_model.onnx_status = 'ready'
+        else:
+            if Config.MODEL_COMPILE_ON_UPLOAD:
+                new_model.compile_status = 'pending'
+            if Config.MODEL_EXPORT_ONNX_ON_UPLOAD:
+                new_model.onnx_status = 'pending'
+
         db.session.add(new_model)
         db.session.commit()
+        bump_version('Models', 'Data_Management')
+
+        # 后台生成优化后的推理文件，不阻塞上传请求
+        if not is_onnx and Config.MODEL_COMPILE_ON_UPLOAD:
+            schedule_compile(new_model.model_id, model_path)
+        if not is_onnx and Config.MODEL_EXPORT_ONNX_ON_UPLOAD:
+            schedule_onnx_export(new_model.model_id, model_path)
 
         return jsonify({"message": "Model uploaded successfully", "model_name": filename}), 200
 
@@ -65,35 +211,40 @@ def upload_model():
 
 # 获取模型接口
 @bp.route('/get_models', methods=['GET'])
+@cached_response('Models')
 def get_models():
     try:
-        # 获取分页参数
-        page = int(request.args.get('page', 1))
-        page_size = int(request.args.get('page_size', 5))
-        
-        models_query = db.session.query(Model).order_by(Model.upload_time.desc())
-        
-        # 分页查询
-        models = models_query.offset((page - 1) * page_size).limit(page_size).all()
-
-        # 获取总数据条数
-        total_models = models_query.count()
-        total_pages = (total_models + page_size - 1) // page_size
+        # 只查询列表需要的列；兼容 page / page_size，也支持 cursor / limit 游标分页
+        models_query = db.session.query(
+            Model.model_id, Model.model_name, Model.model_size, Model.upload_time, Model.backend,
+            Model.compile_status, Model.onnx_status, Model.eager_latency_ms, Model.compiled_latency_ms,
+            Model.onnx_latency_ms, Model.precision_mode, Model.precision_status, Model.precision_accuracy,
+            Model.precision_fp32_accuracy, Model.precision_speedup
+        )
+        models, meta = paginate(models_query, Model.upload_time, Model.model_id, 'Models', default_page_size=5)
 
         model_data = [{
             'model_id': model.model_id,
             'model_name': model.model_name,
             'model_size': model.model_size,
-            'upload_time': model.upload_time.isoformat()
+            'upload_time': model.upload_time.isoformat(),
+            'backend': model.backend,
+            'compile_status': model.compile_status,
+            'onnx_status': model.onnx_status,
+            'eager_latency_ms': model.eager_latency_ms,
+            'compiled_latency_ms': model.compiled_latency_ms,
+            'onnx_latency_ms': model.onnx_latency_ms,
+            'precision_mode': model.precision_mode or 'fp32',
+            'precision_status': model.precision_status,
+            'precision_accuracy': model.precision_accuracy,
+            'precision_fp32_accuracy': model.precision_fp32_accuracy,
+            'precision_speedup': model.precision_speedup
         } for model in models]
 
-        return jsonify({
-            'models': model_data,
-            'total': total_models,
-            'total_pages': total_pages,
-            'current_page': page
-        })
+        return jsonify({'models': model_data, **meta})
 
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error fetching models: {str(e)}")  # 打印详细的错误日志
         return jsonify({"error": "Error fetching models"}), 500
@@ -108,10 +259,22 @@ def delete_model(model_id):
         model_path = model.model_path
         if os.path.exists(model_path):
             os.remove(model_path)
+        invalidate_model(model_path)
+
+        # 删除预编译推理文件和 ONNX 文件
+        for artifact_path in (model.compiled_path, model.onnx_path):
+            if artifact_path:
+                if os.path.exists(artifact_path):
+                    os.remove(artifact_path)
+                invalidate_model(artifact_path)
+
+        # 使用该模型的诊断结果不再复用
+        DiagnosisRecord.query.filter_by(model_id=model_id).update({'cache_key': None})
 
         # 删除数据库中的记录
         db.session.delete(model)
         db.session.commit()
+        bump_version('Models', 'Data_Management')
 
         return jsonify({"message": "模型已删除"}), 200
 
@@ -119,6 +282,108 @@ def delete_model(model_id):
         print(f"Error deleting model: {str(e)}")  # 打印详细的错误日志
         return jsonify({"error": "Error deleting model"}), 500
 
+# 重新生成预编译推理文件
+@bp.route('/compile_model/<int:model_id>', methods=['POST'])
+def compile_model(model_id):
+    try:
+        model = Model.query.get_or_404(model_id)
+        if not os.path.exists(model.model_path):
+            return jsonify({"error": "Model file not found on server"}), 404
+
+        model.compile_status = 'pending'
+        model.compile_error = None
+        db.session.commit()
+        bump_version('Models')
+        schedule_compile(model.model_id, model.model_path)
+
+        return jsonify({"message": "Model compilation started"}), 202
+
+    except Exception as e:
+        print(f"Error starting model compilation: {str(e)}")  # 打印详细的错误日志
+        return jsonify({"error": "Error starting model compilation"}), 500
+
+# 导出 ONNX 模型
+@bp.route('/export_onnx/<int:model_id>', methods=['POST'])
+def export_onnx(model_id):
+    try:
+        model = Model.query.get_or_404(model_id)
+        if model.model_path.lower().endswith('.onnx'):
+            return jsonify({"error": "Model is already in ONNX format"}), 400
+        if not os.path.exists(model.model_path):
+            return jsonify({"error": "Model file not found on server"}), 404
+
+        model.onnx_status = 'pending'
+        model.onnx_error = None
+        db.session.commit()
+        bump_version('Models')
+        schedule_onnx_export(model.model_id, model.model_path)
+
+        return jsonify({"message": "ONNX export started"}), 202
+
+    except Exception as e:
+        print(f"Error starting ONNX export: {str(e)}")  # 打印详细的错误日志
+        return jsonify({"error": "Error starting ONNX export"}), 500
+
+# 设置模型使用的推理后端，为空时自动选择延迟最低的后端
+@bp.route('/model_backend/<int:model_id>', methods=['PUT'])
+def set_model_backend(model_id):
+    model = Model.query.get_or_404(model_id)
+    backend = (request.get_json() or {}).get('backend')
+    if backend is not None and backend not in INFERENCE_BACKENDS:
+        return jsonify({"error": f"Unknown backend, expected one of {sorted(INFERENCE_BACKENDS)}"}), 400
+
+    model.backend = backend
+    db.session.commit()
+    bump_version('Models')
+    return jsonify({"message": "推理后端已更新", "backend": backend}), 200
+
+# 设置模型的推理精度模式，低精度模式需要先在指定数据集上通过准确率评估
+@bp.route('/model_precision/<int:model_id>', methods=['PUT'])
+def set_model_precision(model_id):
+    try:
+        model = Model.query.get_or_404(model_id)
+        data = request.get_json() or {}
+        precision = data.get('precision', 'fp32')
+
+        if precision not in PRECISION_MODES:
+            return jsonify({"error": f"Unknown precision, expected one of {sorted(PRECISION_MODES)}"}), 400
+
+        if precision == 'fp32':
+            # 同时清除上一次低精度评估的结果，列表中不再显示与 fp32 无关的评估数据；进行中的评估完成后也不再写回
+            model.precision_mode = None
+            model.precision_candidate = None
+            model.precision_status = None
+            model.precision_error = None
+            model.precision_accuracy = None
+            model.precision_fp32_accuracy = None
+            model.precision_speedup = None
+            db.session.commit()
+            bump_version('Models')
+            return jsonify({"message": "已恢复 fp32 推理"}), 200
+
+        if model.model_path.lower().endswith('.onnx'):
+            return jsonify({"error": "Precision modes are only supported for PyTorch models"}), 400
+
+        file = File.query.get(data.get('file_id'))
+        if not file:
+            return jsonify({"error": "file_id of an uploaded dataset is required for the accuracy check"}), 400
+        if not os.path.exists(file.file_path) or not os.path.exists(model.model_path):
+            return jsonify({"error": "Model or dataset file not found on server"}), 404
+
+        model.precision_candidate = precision
+        model.precision_status = 'pending'
+        model.precision_error = None
+        db.session.commit()
+        bump_version('Models')
+        schedule_precision_evaluation(model.model_id, model.model_path, file.file_path, precision,
+                                      dataset_key(file))
+
+        return jsonify({"message": "Precision evaluation started"}), 202
+
+    except Exception as e:
+        print(f"Error starting precision evaluation: {str(e)}")  # 打印详细的错误日志
+        return jsonify({"error": "Error starting precision evaluation"}), 500
+
 # 检查模型是否已存在
 @bp.route('/check_model_exists', methods=['GET'])
 def check_model_exists():
@@ -132,3 +397,18 @@ def check_model_exists():
         return jsonify({'exists': True})  # 文件已存在
     else:
         return jsonify({'exists': False})  # 文件不存在
+
+# 查看推理进程中的模型缓存统计
+@bp.route('/model_cache/stats', methods=['GET'])
+def model_cache_stats():
+    pool = get_pool(start=False)
+    if pool is None:
+        return jsonify({'workers': []}), 200
+
+    workers = []
+    for future in pool.broadcast('model_cache_stats', timeout=5):
+        try:
+            workers.append(future.result(timeout=5))
+        except Exception as e:
+            workers.append({'error': str(e)})
+    return jsonify({'workers': workers}), 200
@@ -1,18 +1,166 @@
+# my_logging.py
+# 日志：请求线程中的 QueueHandler 只把日志放入内存队列，由 QueueListener 的后台线程格式化为 JSON 并写入轮转文件，
+# 写文件的耗时不计入请求。按模块设置日志级别，DEBUG 日志按比例采样，队列满时丢弃而不是阻塞。
+import atexit
+import copy
+import itertools
+import json
 import logging
-from logging.handlers import RotatingFileHandler
 import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import has_request_context, request
+from flask.logging import default_handler
+
+from config import Config
+
+# LogRecord 的标准属性，其余属性视为通过 extra 传入的结构化字段
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """在请求线程中记录请求方法和路径，后台写入线程中已经没有请求上下文"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    DEBUG 日志按模块采样，其他级别全部保留
+    :param rate: 保留比例
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.every = max(int(round(1 / rate)), 1) if rate > 0 else 0
+        self._counters = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        if not self.every:
+            return False
+        counter = self._counters.get(record.name)
+        if counter is None:
+            counter = self._counters.setdefault(record.name, itertools.count())
+        return next(counter) % self.every == 0
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    队列满时丢弃日志并计数，不阻塞调用方
+    :param max_length: 消息的最大长度
+    """
+
+    def __init__(self, log_queue, max_length):
+        super().__init__(log_queue)
+        self.max_length = max_length
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        # 在调用方线程中合并参数、格式化异常，后台线程不再需要原始对象
+        message = record.getMessage()
+        if self.max_length and len(message) > self.max_length:
+            message = f"{message[:self.max_length]}... ({len(message)} chars)"
+        record = copy.copy(record)
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+_listener = None
+_queue_handler = None
+
 
 def setup_logging(app):
-    # 创建日志目录
-    if not os.path.exists('logs'):
-        os.mkdir('logs')
-    
-    # 设置日志文件和格式
-    log_handler = RotatingFileHandler('logs/app.log', maxBytes=10240, backupCount=10)
-    log_handler.setLevel(logging.INFO)
-    log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
-
-    # 将日志处理器添加到 Flask 应用
-    app.logger.addHandler(log_handler)
-    app.logger.setLevel(logging.INFO)
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    os.makedirs(Config.LOG_FOLDER, exist_ok=True)
+
+    # 后台线程中实际写日志的处理器
+    file_handler = RotatingFileHandler(os.path.join(Config.LOG_FOLDER, 'app.log'), maxBytes=Config.LOG_MAX_BYTES,
+                                       backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+    handlers = [file_handler]
+    if Config.LOG_CONSOLE:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        handlers.append(console_handler)
+
+    # 请求线程中只做过滤和入队
+    log_queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue, Config.LOG_MAX_MESSAGE_LENGTH)
+    queue_handler.addFilter(DebugSampler(Config.LOG_DEBUG_SAMPLE_RATE))
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(Config.LOG_LEVEL)
+    for name, level in Config.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+
+    # app.logger 交给根日志器处理
+    app.logger.removeHandler(default_handler)
+    app.logger.setLevel(logging.NOTSET)
+    app.logger.propagate = True
+
+    _queue_handler = queue_handler
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
     app.logger.info("Logging is set up")
+
+
+# 日志队列的当前长度和丢弃的条数，供 /metrics 使用
+def log_queue_stats():
+    if _queue_handler is None:
+        return {}
+    return {'depth': _queue_handler.queue.qsize(), 'dropped': _queue_handler.dropped}
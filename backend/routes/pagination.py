@@ -0,0 +1,122 @@
+# pagination.py
+# 列表接口共用的分页工具：按 (时间, ID) 倒序的游标分页，翻到任意深度的代价都相同；
+# 同时兼容原来的 page / page_size 分页参数。总数按查询缓存一小段时间，不必每页都执行 count()。
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+
+from flask import request
+from sqlalchemy import and_, or_
+
+from config import Config
+
+
+class PaginationError(ValueError):
+    """无效的分页参数，接口返回 400"""
+
+
+class CursorError(PaginationError):
+    """无法解析的分页游标"""
+
+
+def encode_cursor(timestamp, row_id):
+    payload = json.dumps([timestamp.isoformat() if timestamp else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (datetime.fromisoformat(timestamp) if timestamp else None), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise CursorError(f"Invalid cursor: {cursor}") from e
+
+
+# 缓存的列表总数：键 -> (总数, 过期时间)
+_counts = {}
+_counts_lock = threading.Lock()
+
+
+def cached_count(key, query, ttl=None):
+    """
+    返回缓存的总数，过期后重新执行 count()
+    :param key: 缓存键，通常为表名
+    :param query: 用于计数的查询
+    :param ttl: 缓存时间，单位为秒
+    """
+    ttl = Config.LIST_COUNT_CACHE_TTL if ttl is None else ttl
+    now = time.monotonic()
+    with _counts_lock:
+        entry = _counts.get(key)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+    total = query.order_by(None).count()
+    with _counts_lock:
+        _counts[key] = (total, now + ttl)
+    return total
+
+
+# 表中的数据增删后让缓存的总数失效
+def invalidate_count(key):
+    with _counts_lock:
+        _counts.pop(key, None)
+
+
+def _int_arg(name, default, minimum=1, maximum=None):
+    try:
+        value = max(int(request.args.get(name, default)), minimum)
+    except ValueError:
+        raise PaginationError(f"{name} must be an integer")
+    return min(value, maximum) if maximum else value
+
+
+def paginate(query, time_column, id_column, count_key, default_page_size=None):
+    """
+    按请求参数分页
+    - cursor / limit：游标分页，按 (time_column, id_column) 倒序，返回 next_cursor
+    - page / page_size：原来的页码分页，default_page_size 不为空时没有参数也使用页码分页
+    - with_total=false：不返回总数
+    :param query: 只选择需要列的查询，各行必须包含 time_column 与 id_column
+    :param count_key: 总数缓存键
+    :return: (当前页的行, 分页信息字典)
+    """
+    with_total = request.args.get('with_total', 'true').lower() != 'false'
+    use_pages = 'page' in request.args or (
+        default_page_size is not None and 'cursor' not in request.args and 'limit' not in request.args)
+
+    meta = {}
+    if use_pages:
+        page = _int_arg('page', 1)
+        page_size = _int_arg('page_size', default_page_size or Config.LIST_DEFAULT_LIMIT,
+                             maximum=Config.LIST_MAX_LIMIT)
+        rows = query.order_by(time_column.desc(), id_column.desc()) \
+            .offset((page - 1) * page_size).limit(page_size + 1).all()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        meta['current_page'] = page
+        if with_total:
+            total = cached_count(count_key, query)
+            meta['total'] = total
+            meta['total_pages'] = (total + page_size - 1) // page_size
+    else:
+        limit = _int_arg('limit', Config.LIST_DEFAULT_LIMIT, maximum=Config.LIST_MAX_LIMIT)
+        cursor = request.args.get('cursor')
+        page_query = query
+        if cursor:
+            timestamp, row_id = decode_cursor(cursor)
+            page_query = query.filter(or_(time_column < timestamp,
+                                          and_(time_column == timestamp, id_column < row_id)))
+        rows = page_query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if with_total:
+            # 总数按不带游标条件的查询计算
+            meta['total'] = cached_count(count_key, query)
+    if has_more and rows:
+        last = rows[-1]
+        meta['next_cursor'] = encode_cursor(getattr(last, time_column.key), getattr(last, id_column.key))
+    else:
+        meta['next_cursor'] = None
+    return rows, meta
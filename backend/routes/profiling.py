@@ -0,0 +1,198 @@
+# profiling.py
+# 诊断剖析：管理员可以在诊断请求中加上 profile=true，推理进程用 cProfile 记录整个诊断流水线，用 torch.profiler 记录前向计算，
+# 并记录 tracemalloc 的 Python 堆峰值和进程常驻内存峰值。结果保存在 PROFILE_DIR 下以诊断产物 ID 命名的目录中，
+# 与诊断记录关联，只有管理员可以查看和下载。
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import warnings
+from contextlib import contextmanager
+
+from flask import Blueprint, jsonify
+
+from config import Config
+from models import DiagnosisRecord
+from .auth_context import admin_required
+from .artifacts import send_artifact
+from .metrics import rss_bytes
+
+bp = Blueprint('profiling', __name__)
+
+# 剖析结果目录中的文件 -> MIME 类型
+PROFILE_ARTIFACTS = {
+    'pipeline.prof': 'application/octet-stream',  # cProfile 原始数据，可用 pstats / snakeviz 打开
+    'pipeline.txt': 'text/plain',  # 按累计耗时排序的函数列表
+    'forward_trace.json': 'application/json',  # 前向计算的 Chrome trace，可用 chrome://tracing 或 Perfetto 打开
+    'forward_ops.txt': 'text/plain',  # 前向计算中各算子的耗时和内存汇总
+    'memory.json': 'application/json',  # 内存峰值和仍存活的主要分配位置
+}
+
+# tracemalloc 和内存峰值都是进程级的，同一个 worker 中同一时间只进行一次剖析
+_session_lock = threading.Lock()
+
+
+def _reset_peak_rss():
+    # 清零 /proc 中的常驻内存峰值（VmHWM），只在 Linux 上可用
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return None
+
+
+class ProfileSession:
+    """
+    一次诊断的剖析，在推理进程中使用：with ProfileSession(directory) as profiler: ...
+    cProfile 只记录进入会话的线程；内存峰值是进程级的，同一 worker 中并发的其他任务也会计入
+    :param directory: 剖析结果的保存目录
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.summary = {}
+        self._profile = cProfile.Profile()
+        self._started_tracemalloc = False
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def __enter__(self):
+        _session_lock.acquire()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._rss_start = rss_bytes()
+            self._rss_reset = _reset_peak_rss()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(Config.PROFILE_TRACEMALLOC_FRAMES)
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+        except BaseException:
+            _session_lock.release()
+            raise
+        self._start = time.perf_counter()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profile.disable()
+        try:
+            if exc_type is None:
+                self._write(time.perf_counter() - self._start)
+        finally:
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            _session_lock.release()
+        return False
+
+    def _write(self, elapsed):
+        self._profile.dump_stats(self._path('pipeline.prof'))
+        with open(self._path('pipeline.txt'), 'w', encoding='utf-8') as f:
+            pstats.Stats(self._profile, stream=f).sort_stats('cumulative').print_stats(Config.PROFILE_TOP_FUNCTIONS)
+
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        summary = {
+            'wall_seconds': elapsed,
+            'python_heap_peak_bytes': peak,
+            'python_heap_end_bytes': current,
+            'rss_start_bytes': self._rss_start,
+            'rss_end_bytes': rss_bytes(),
+            'rss_peak_bytes': _peak_rss(),
+            # 无法清零峰值时为进程启动以来的峰值
+            'rss_peak_scope': 'diagnosis' if self._rss_reset else 'process',
+        }
+        memory = dict(summary, retained_allocations=[{
+            'location': str(stat.traceback[0]),
+            'size_bytes': stat.size,
+            'count': stat.count,
+        } for stat in snapshot.statistics('lineno')[:Config.PROFILE_TOP_ALLOCATIONS]])
+        with open(self._path('memory.json'), 'w', encoding='utf-8') as f:
+            json.dump(memory, f, indent=2)
+
+        self.summary = dict(summary, artifacts=sorted(name for name in os.listdir(self.directory)
+                                                      if name in PROFILE_ARTIFACTS))
+
+    @contextmanager
+    def trace_forward(self):
+        """
+        用 torch.profiler 记录前向计算，只记录前 PROFILE_TRACE_BATCHES 个批次，避免 trace 过大
+        :return: 每个批次结束后调用的 step 函数
+        """
+        import torch  # 只在推理进程中导入
+        from torch.profiler import ProfilerActivity, profile, schedule
+
+        use_cuda = torch.cuda.is_available()
+        activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if use_cuda else [])
+
+        def on_trace_ready(prof):
+            prof.export_chrome_trace(self._path('forward_trace.json'))
+            table = prof.key_averages(group_by_input_shape=True).table(
+                sort_by='self_cuda_time_total' if use_cuda else 'self_cpu_time_total',
+                row_limit=Config.PROFILE_TOP_FUNCTIONS)
+            with open(self._path('forward_ops.txt'), 'w', encoding='utf-8') as f:
+                f.write(table)
+
+        # 第一个批次包含的初始化开销也是剖析的对象，因此不设预热
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            trace_schedule = schedule(wait=0, warmup=0, active=Config.PROFILE_TRACE_BATCHES, repeat=1)
+        with profile(activities=activities, schedule=trace_schedule, on_trace_ready=on_trace_ready,
+                     record_shapes=True, profile_memory=True) as prof:
+            yield prof.step
+
+
+def _profiled_record(record_id):
+    record = DiagnosisRecord.query.get(record_id)
+    if record is None or not record.profile_path or not os.path.isdir(record.profile_path):
+        return None
+    return record
+
+
+# 诊断记录的剖析摘要和可下载的文件
+@bp.route('/diagnosis_records/<int:record_id>/profile', methods=['GET'])
+@admin_required
+def get_profile(record_id):
+    record = _profiled_record(record_id)
+    if record is None:
+        return jsonify(message="No profile stored for this record"), 404
+    try:
+        with open(os.path.join(record.profile_path, 'memory.json'), encoding='utf-8') as f:
+            memory = json.load(f)
+    except (OSError, ValueError):
+        memory = None
+    artifacts = [{"name": name, "url": f"/diagnosis_records/{record_id}/profile/{name}"}
+                 for name in PROFILE_ARTIFACTS if os.path.exists(os.path.join(record.profile_path, name))]
+    return jsonify(record_id=record_id, memory=memory, artifacts=artifacts), 200
+
+
+@bp.route('/diagnosis_records/<int:record_id>/profile/<name>', methods=['GET'])
+@admin_required
+def download_profile_artifact(record_id, name):
+    if name not in PROFILE_ARTIFACTS:
+        return jsonify(message=f"Unknown profile artifact, expected one of {sorted(PROFILE_ARTIFACTS)}"), 400
+    record = _profiled_record(record_id)
+    path = os.path.join(record.profile_path, name) if record else None
+    if path is None or not os.path.exists(path):
+        return jsonify(message="Profile artifact not found"), 404
+    return send_artifact(path, mimetype=PROFILE_ARTIFACTS[name], as_attachment=True,
+                         download_name=f"diagnosis_{record_id}_{name}")
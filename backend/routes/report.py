@@ -1,39 +1,281 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from models import DiagnosisRecord, Report, File, Model, db  # 导入 File 和 Model
+from config import Config
+from .inference_pool import get_pool, WorkerError
+from .report_render import report_image_path
+from .statistics import remove_from_rollups
+from .response_cache import cached_response, bump_version
+from .artifacts import send_artifact
+from .metrics import record_stages
 import shutil
 import os
+import json
+import threading
+import zipfile
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
 import logging
 from fpdf import FPDF
 
 bp = Blueprint('report', __name__)
 
-# 设置日志
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# 获取所有诊断记录
+# 可选的降维方法，与推理进程中 visualization 的定义一致
+EMBEDDING_METHODS = {'tsne', 'pca'}
+
+# 降维图的缓存路径：与 logits 样本放在一起，按方法区分
+def embedding_image_path(embedding_path, method):
+    return f"{os.path.splitext(embedding_path)[0]}_{method}.png"
+
+# 正在绘制的降维图：图像路径 -> Future，同一张图同时只提交一次
+_renders = {}
+_renders_lock = threading.Lock()
+
+
+def _render_done(image_path, future):
+    # 回调可能在进程池持有自身锁时执行，这里不获取 _renders_lock，避免与 submit_embedding_render 交叉加锁
+    if _renders.get(image_path) is future:
+        _renders.pop(image_path, None)
+    if not future.cancelled() and future.exception() is None:
+        record_stages(future.result().get('timings'))
+
+
+# 在推理进程池中绘制降维图，已在绘制的图返回同一个 Future
+def submit_embedding_render(embedding_path, method='tsne'):
+    image_path = embedding_image_path(embedding_path, method)
+    with _renders_lock:
+        future = _renders.get(image_path)
+        if future is not None:
+            return future
+        future = get_pool().submit('render_embedding', sample_path=embedding_path, image_path=image_path,
+                                   method=method, max_points=Config.EMBEDDING_MAX_POINTS)
+        _renders[image_path] = future
+    future.add_done_callback(lambda f: _render_done(image_path, f))
+    return future
+
+# 获取诊断记录的降维图，第一次请求时绘制并缓存；绘制较慢时返回 202，客户端按 Retry-After 重试
+@bp.route('/diagnosis_records/<int:record_id>/tsne', methods=['GET'])
+def get_embedding_image(record_id):
+    try:
+        method = request.args.get('method', 'tsne')
+        if method not in EMBEDDING_METHODS:
+            return jsonify(message=f"Unknown method, expected one of {sorted(EMBEDDING_METHODS)}"), 400
+
+        record = DiagnosisRecord.query.get(record_id)
+        if not record:
+            return jsonify(message="Record not found"), 404
+
+        # 早于降维图延迟绘制的记录只有诊断时生成的 t-SNE 图
+        if not record.embedding_path:
+            if method == 'tsne' and record.tsne_path and os.path.exists(record.tsne_path):
+                return send_artifact(record.tsne_path, mimetype='image/png')
+            return jsonify(message="No embedding sample stored for this record"), 404
+
+        image_path = embedding_image_path(record.embedding_path, method)
+        if not os.path.exists(image_path):
+            if not os.path.exists(record.embedding_path):
+                return jsonify(message="Embedding sample not found on server"), 404
+            try:
+                submit_embedding_render(record.embedding_path, method).result(timeout=Config.EMBEDDING_RENDER_WAIT)
+            except FutureTimeoutError:
+                response = jsonify(message="Embedding is being rendered, retry later", status='rendering')
+                response.headers['Retry-After'] = str(Config.EMBEDDING_RENDER_RETRY_AFTER)
+                return response, 202
+
+        if method == 'tsne' and record.tsne_path != image_path:
+            record.tsne_path = image_path
+            db.session.commit()
+
+        return send_artifact(image_path, mimetype='image/png')
+    except WorkerError as e:
+        logger.error(f"Error rendering embedding for record {record_id}: {str(e)}")
+        return jsonify(message="Visualization error", error=str(e)), 500
+    except Exception as e:
+        logger.error(f"Error fetching embedding for record {record_id}: {str(e)}")
+        return jsonify(message="Internal server error"), 500
+
+# 在推理进程池中生成 PDF 报告，完成后把状态写回 Report 记录
+def schedule_report(diagnosis_record, report, file_name, model_name):
+    """
+    :param diagnosis_record: DiagnosisRecord 记录
+    :param report: 关联的 Report 记录，状态应为 pending
+    :param file_name: 数据文件名
+    :param model_name: 模型名
+    """
+    app = current_app._get_current_object()
+    report_id = report.report_id
+    try:
+        diagnosis_data = json.loads(diagnosis_record.diagnosis_result)
+    except json.JSONDecodeError:
+        diagnosis_data = {}
+
+    future = get_pool().submit('render_report', report_path=report.report_path, report_name=report.report_name,
+                               file_name=file_name, model_name=model_name, diagnosis_data=diagnosis_data,
+                               created_at=diagnosis_record.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                               confusion_matrix_path=diagnosis_record.confusion_matrix_path)
+
+    def on_done(f):
+        with app.app_context():
+            try:
+                report = Report.query.get(report_id)
+                if report is None:
+                    return
+                try:
+                    record_stages(f.result().get('timings'))
+                    report.status = 'ready'
+                    report.error = None
+                except Exception as e:
+                    logger.error(f"Error rendering report {report_id}: {str(e)}")
+                    report.status = 'failed'
+                    report.error = str(e)
+                db.session.commit()
+                bump_version('Reports')
+            except Exception as e:
+                logger.error(f"Error saving report {report_id} status: {str(e)}")
+            finally:
+                db.session.remove()
+
+    future.add_done_callback(on_done)
+
+# 以 zip 流的形式逐块写出，不在内存中拼接整个压缩包
+class _ZipStream:
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        chunks, self._chunks = self._chunks, []
+        return b''.join(chunks)
+
+def _iter_zip(paths, chunk_size=1024 * 1024):
+    stream = _ZipStream()
+    # PDF 内部已压缩，直接存储即可
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in paths:
+            with open(path, 'rb') as src, archive.open(arcname, 'w', force_zip64=True) as dst:
+                for chunk in iter(lambda: src.read(chunk_size), b''):
+                    dst.write(chunk)
+                    yield stream.pop()
+            yield stream.pop()
+    yield stream.pop()
+
+# 批量导出报告，record_ids 为逗号分隔的诊断记录 ID，省略时导出全部已生成的报告
+@bp.route('/export_reports', methods=['GET'])
+def export_reports():
+    try:
+        query = db.session.query(Report.report_name, Report.report_path) \
+            .join(DiagnosisRecord, DiagnosisRecord.report_id == Report.report_id) \
+            .filter(db.or_(Report.status == 'ready', Report.status.is_(None)))
+        record_ids = request.args.get('record_ids')
+        if record_ids:
+            try:
+                ids = [int(x) for x in record_ids.split(',') if x.strip()]
+            except ValueError:
+                return jsonify(message="record_ids must be a comma separated list of integers"), 400
+            query = query.filter(DiagnosisRecord.record_id.in_(ids))
+
+        paths = []
+        seen = set()
+        for report_name, report_path in query.all():
+            if not report_path or not os.path.exists(report_path):
+                continue
+            arcname = os.path.basename(report_path)
+            if arcname in seen:
+                continue
+            seen.add(arcname)
+            paths.append((arcname, report_path))
+
+        if not paths:
+            return jsonify(message="No reports to export"), 404
+
+        filename = f"reports_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.zip"
+        return Response(stream_with_context(_iter_zip(paths)), mimetype='application/zip',
+                        headers={"Content-Disposition": f"attachment; filename={filename}"})
+    except Exception as e:
+        logger.error(f"Error exporting reports: {str(e)}")
+        return jsonify(message="Internal server error"), 500
+
+# 诊断记录列表可用的排序字段
+RECORD_SORT_COLUMNS = {
+    'created_at': DiagnosisRecord.created_at,
+    'record_id': DiagnosisRecord.record_id,
+    'file_name': File.file_name,
+    'model_name': Model.model_name,
+}
+
+# 解析 ISO 格式的日期参数，只有日期时包含当天
+def _parse_date(value, end_of_day=False):
+    parsed = datetime.fromisoformat(value)
+    if end_of_day and len(value) <= 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return parsed
+
+# 获取诊断记录：一次联表查询，支持按模型、文件、日期范围过滤，服务端排序和分页
 @bp.route('/get_diagnosis_records', methods=['GET'])
+@cached_response('Diagnosis_Records', 'Reports', 'Files', 'Models')
 def get_diagnosis_records():
     try:
-        records = DiagnosisRecord.query.all()
-        records_data = []
-        for record in records:
-            file = File.query.get(record.file_id)
-            model = Model.query.get(record.model_id)
-
-            # 获取关联的报告
-            report = Report.query.filter(Report.diagnosis_record.has(DiagnosisRecord.record_id == record.record_id)).first()
-
-            records_data.append({
-                "record_id": record.record_id,
-                "file_name": file.file_name if file else 'Unknown',
-                "model_name": model.model_name if model else 'Unknown',
-                "created_at": record.created_at,
-                "report_path": report.report_path if report else '',
-                "report_name": report.report_name if report else 'No Report'  # 添加报告名
-            })
-        return jsonify(records=records_data), 200
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', 50)), 1), 500)
+        sort_by = request.args.get('sort_by', 'created_at')
+        order = request.args.get('order', 'desc')
+        if sort_by not in RECORD_SORT_COLUMNS or order not in ('asc', 'desc'):
+            return jsonify(message=f"sort_by must be one of {sorted(RECORD_SORT_COLUMNS)}, order asc or desc"), 400
+
+        # 只查询页面需要的列
+        query = db.session.query(
+            DiagnosisRecord.record_id,
+            DiagnosisRecord.created_at,
+            File.file_name,
+            Model.model_name,
+            Report.report_path,
+            Report.report_name,
+            Report.status
+        ).outerjoin(File, File.file_id == DiagnosisRecord.file_id) \
+            .outerjoin(Model, Model.model_id == DiagnosisRecord.model_id) \
+            .outerjoin(Report, Report.report_id == DiagnosisRecord.report_id)
+
+        if request.args.get('model_id'):
+            query = query.filter(DiagnosisRecord.model_id == int(request.args['model_id']))
+        if request.args.get('file_id'):
+            query = query.filter(DiagnosisRecord.file_id == int(request.args['file_id']))
+        if request.args.get('date_from'):
+            query = query.filter(DiagnosisRecord.created_at >= _parse_date(request.args['date_from']))
+        if request.args.get('date_to'):
+            query = query.filter(DiagnosisRecord.created_at <= _parse_date(request.args['date_to'], end_of_day=True))
+
+        total = query.order_by(None).count()
+
+        column = RECORD_SORT_COLUMNS[sort_by]
+        direction = column.asc() if order == 'asc' else column.desc()
+        tie_breaker = DiagnosisRecord.record_id.asc() if order == 'asc' else DiagnosisRecord.record_id.desc()
+        rows = query.order_by(direction, tie_breaker).offset((page - 1) * page_size).limit(page_size).all()
+
+        records_data = [{
+            "record_id": row.record_id,
+            "file_name": row.file_name or 'Unknown',
+            "model_name": row.model_name or 'Unknown',
+            "created_at": row.created_at,
+            "report_path": row.report_path or '',
+            "report_status": (row.status or 'ready') if row.report_path else None,
+            "report_name": row.report_name or 'No Report'  # 添加报告名
+        } for row in rows]
+        return jsonify(records=records_data, total=total, total_pages=(total + page_size - 1) // page_size,
+                       current_page=page), 200
+    except ValueError as e:
+        return jsonify(message=f"Invalid query parameter: {str(e)}"), 400
     except Exception as e:
         logger.error(f"Error fetching diagnosis records: {str(e)}")
         return jsonify(message="Internal server error"), 500
@@ -49,12 +291,37 @@ def delete_diagnosis_record(record_id):
         # 删除报告
         report = Report.query.filter_by(diagnosis_record=diagnosis_record).first()
         if report:
-            os.remove(report.report_path)  # 删除报告文件
+            if os.path.exists(report.report_path):
+                os.remove(report.report_path)  # 删除报告文件
             db.session.delete(report)
 
-        # 删除诊断记录
+        # 删除 logits 样本和缓存的降维图
+        if diagnosis_record.embedding_path:
+            for path in [diagnosis_record.embedding_path] + [
+                    embedding_image_path(diagnosis_record.embedding_path, method) for method in EMBEDDING_METHODS]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        # 删除混淆矩阵图，早期记录共用同一个图像文件，仍被其他记录引用时保留
+        cm_path = diagnosis_record.confusion_matrix_path
+        if cm_path and os.path.exists(cm_path) and not DiagnosisRecord.query.filter(
+                DiagnosisRecord.confusion_matrix_path == cm_path,
+                DiagnosisRecord.record_id != record_id).first():
+            os.remove(cm_path)
+            # 嵌入报告时缓存的缩小图像
+            if os.path.exists(report_image_path(cm_path)):
+                os.remove(report_image_path(cm_path))
+
+        # 删除剖析结果
+        if diagnosis_record.profile_path:
+            shutil.rmtree(diagnosis_record.profile_path, ignore_errors=True)
+
+        # 删除诊断记录，并重新汇总受影响的统计行
         db.session.delete(diagnosis_record)
+        db.session.flush()
+        remove_from_rollups(diagnosis_record)
         db.session.commit()
+        bump_version('Diagnosis_Records', 'Reports')
 
         return jsonify(message="Record deleted successfully"), 200
     except Exception as e:
@@ -0,0 +1,100 @@
+# report_render.py
+# PDF 报告生成：在推理进程池中执行，不访问数据库，所需信息由主进程一次性传入。
+# 嵌入的图像先按报告中的显示尺寸缩小并缓存，同一张图再次生成报告时直接复用。
+import os
+import time
+
+from fpdf import FPDF
+from PIL import Image
+
+from config import Config
+
+
+# 缩小后的图像缓存路径
+def report_image_path(image_path, max_width=None):
+    root, _ = os.path.splitext(image_path)
+    return f"{root}_report_{max_width or Config.REPORT_IMAGE_MAX_WIDTH}.png"
+
+
+# 缩小后用于嵌入报告的图像，源图像更新后重新生成
+def report_image(image_path, max_width=None):
+    max_width = max_width or Config.REPORT_IMAGE_MAX_WIDTH
+    cached_path = report_image_path(image_path, max_width)
+    if os.path.exists(cached_path) and os.path.getmtime(cached_path) >= os.path.getmtime(image_path):
+        return cached_path
+
+    with Image.open(image_path) as image:
+        if image.width <= max_width:
+            return image_path
+        height = round(image.height * max_width / image.width)
+        resized = image.convert('RGB').resize((max_width, height), Image.LANCZOS)
+
+    tmp_path = cached_path + '.tmp.png'
+    resized.save(tmp_path, format='PNG', optimize=True)
+    os.replace(tmp_path, cached_path)
+    return cached_path
+
+
+# 推理进程池中的报告生成任务
+def render_report(report_path, report_name, file_name, model_name, diagnosis_data, created_at,
+                  confusion_matrix_path=None):
+    """
+    生成 PDF 诊断报告
+    :param report_path: 报告保存路径
+    :param report_name: 报告名称
+    :param file_name: 数据文件名
+    :param model_name: 模型名
+    :param diagnosis_data: 诊断指标字典
+    :param created_at: 诊断时间字符串
+    :param confusion_matrix_path: 混淆矩阵图路径
+    :return: 报告路径
+    """
+    start = time.perf_counter()
+    # Create PDF instance
+    pdf = FPDF()
+    pdf.add_page()
+
+    # Set title
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(200, 10, txt="Diagnosis Report", ln=True, align='C')
+
+    # Set content
+    pdf.set_font('Arial', '', 12)
+    pdf.ln(10)  # Space
+    pdf.cell(200, 10, txt=f"Report Name: {report_name}", ln=True)  # Report name
+    pdf.cell(200, 10, txt=f"File Name: {file_name}", ln=True)
+    pdf.cell(200, 10, txt=f"Model Name: {model_name}", ln=True)
+
+    # Diagnosis result (formatting the metrics)
+    pdf.ln(10)  # Space
+    pdf.cell(200, 10, txt="Diagnosis Results:", ln=True)
+
+    # Extracting and formatting the metrics
+    metrics = {
+        "Accuracy": diagnosis_data.get("accuracy", "N/A"),
+        "Precision": diagnosis_data.get("precision", "N/A"),
+        "Recall": diagnosis_data.get("recall", "N/A"),
+        "F1 Score": diagnosis_data.get("f1", "N/A"),
+        "Specificity": diagnosis_data.get("specificity", "N/A")
+    }
+
+    # Formatting the metrics to match the desired structure
+    pdf.ln(5)  # Space
+    for metric, value in metrics.items():
+        pdf.cell(200, 10, txt=f"{metric}: {value}", ln=True)
+
+    # Diagnosis time
+    pdf.cell(200, 10, txt=f"Diagnosis Time: {created_at}", ln=True)
+
+    # Insert confusion matrix image
+    if confusion_matrix_path and os.path.exists(confusion_matrix_path):
+        pdf.ln(10)  # Space
+        pdf.image(report_image(confusion_matrix_path), x=10, w=180)  # Adjust image width
+
+    # 先写临时文件再替换，下载时不会读到写了一半的报告
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    tmp_path = report_path + '.tmp'
+    pdf.output(tmp_path)
+    os.replace(tmp_path, report_path)
+
+    return {"report_path": report_path, "timings": {"pdf": time.perf_counter() - start}}
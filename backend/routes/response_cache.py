@@ -0,0 +1,154 @@
+# response_cache.py
+# 列表接口的响应缓存：每张表维护一个版本号，增删数据的接口提升版本号；
+# ETag 由请求参数和相关表的版本号生成，未变化时直接返回 304，或复用缓存的 JSON（较大的响应同时缓存 gzip 压缩结果）。
+# 版本号保存在进程内，与 pagination 中的总数缓存一样假定单进程部署，另按 RESPONSE_CACHE_MAX_STALENESS 定期失效；
+# 多个 gunicorn worker 时一个进程提升的版本号不会通知其他进程，其他进程最多在 RESPONSE_CACHE_MAX_STALENESS 秒后看到变化。
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+from config import Config
+from .pagination import invalidate_count
+
+# 表名 -> 版本号
+_versions = defaultdict(int)
+_versions_lock = threading.Lock()
+
+
+def bump_version(*tables):
+    """
+    表中的数据变化后提升版本号，同时让缓存的列表总数失效
+    :param tables: 表名，与 __tablename__ 一致
+    """
+    with _versions_lock:
+        for table in tables:
+            _versions[table] += 1
+    for table in tables:
+        invalidate_count(table)
+
+
+def table_versions(tables):
+    with _versions_lock:
+        return tuple(_versions[table] for table in tables)
+
+
+# 缓存的响应内容
+@dataclass
+class CachedResponse:
+    body: bytes
+    gzipped: bytes  # 小于 RESPONSE_GZIP_MIN_SIZE 时为 None
+    mimetype: str
+    headers: list
+
+
+class ResponseCache:
+    """
+    以 ETag 为键的 LRU 响应缓存
+    :param max_size: 最大条数
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0  # 304 和复用缓存内容都计为命中
+        self.misses = 0
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def hit_ratio(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return self.hits / lookups if lookups else 0.0
+
+    def put(self, etag, entry):
+        with self._lock:
+            self._entries[etag] = entry
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache(Config.RESPONSE_CACHE_SIZE)
+
+
+def _etag(tables):
+    # 同一路径和参数、相关表版本号不变、且处于同一个复用时间段内时 ETag 相同
+    epoch = int(time.time() // Config.RESPONSE_CACHE_MAX_STALENESS)
+    args = sorted(request.args.items(multi=True))
+    key = f"{request.path}|{args}|{tables}|{table_versions(tables)}|{epoch}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _build(entry, etag):
+    use_gzip = entry.gzipped is not None and request.accept_encodings['gzip'] > 0
+    response = current_app.response_class(entry.gzipped if use_gzip else entry.body, status=200,
+                                          mimetype=entry.mimetype)
+    response.headers.extend(entry.headers)
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    return _conditional_headers(response, etag)
+
+
+def _conditional_headers(response, etag):
+    # 内容相同但压缩方式可能不同，因此使用弱 ETag；no-cache 让浏览器每次都带 If-None-Match 重新验证
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def cached_response(*tables):
+    """
+    缓存 GET 接口的 200 JSON 响应
+    :param tables: 响应内容依赖的表名，其中任意一张表的版本号变化都会让缓存失效
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = _etag(tables)
+            if request.if_none_match.contains_weak(etag):
+                response_cache.record_hit()
+                return _conditional_headers(current_app.response_class(status=304), etag)
+
+            entry = response_cache.get(etag)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                # 只缓存成功的 JSON 响应，错误直接返回
+                if response.status_code != 200 or response.mimetype != 'application/json':
+                    return response
+                body = response.get_data()
+                entry = CachedResponse(
+                    body=body,
+                    gzipped=gzip.compress(body, compresslevel=6) if len(body) >= Config.RESPONSE_GZIP_MIN_SIZE
+                    else None,
+                    mimetype=response.mimetype,
+                    headers=[(name, value) for name, value in response.headers.items()
+                             if name not in ('Content-Type', 'Content-Length')]
+                )
+                response_cache.put(etag, entry)
+            return _build(entry, etag)
+        return wrapper
+    return decorator
@@ -0,0 +1,172 @@
+# statistics.py
+# 诊断指标统计：诊断记录上的指标保存为带索引的数值列，另外按模型、按天和模型维护汇总表，
+# 新增和删除诊断记录时增量更新，统计接口只读取汇总表，不再逐行解析 diagnosis_result 中的 JSON。
+from datetime import date, datetime, time, timedelta
+
+from flask import Blueprint, request, jsonify
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+
+from models import DiagnosisRecord, Model, ModelMetricRollup, DailyMetricRollup, db
+import logging
+
+bp = Blueprint('statistics', __name__)
+
+logger = logging.getLogger(__name__)
+
+# 保存为数值列并参与汇总的指标
+METRICS = ('accuracy', 'precision', 'recall', 'f1', 'specificity')
+
+
+# 把诊断结果中的指标写入诊断记录的数值列
+def set_record_metrics(record, diagnosis_data):
+    for metric in METRICS:
+        value = diagnosis_data.get(metric)
+        setattr(record, metric, float(value) if value is not None else None)
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def _increment(rollup, keys, values, initial):
+    # 先原地累加，汇总行不存在时再插入；并发插入冲突时回退为累加
+    if db.session.query(rollup).filter_by(**keys).update(values, synchronize_session=False):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(rollup(**keys, **initial))
+    except IntegrityError:
+        db.session.query(rollup).filter_by(**keys).update(values, synchronize_session=False)
+
+
+def add_to_rollups(record):
+    """
+    新增诊断记录后累加到汇总表，由调用方提交事务
+    :param record: 已写入数值列并已生成 created_at 的 DiagnosisRecord
+    """
+    metrics = {metric: getattr(record, metric) or 0.0 for metric in METRICS}
+    initial = {f"{metric}_sum": value for metric, value in metrics.items()}
+    initial['diagnoses'] = 1
+
+    for rollup, keys in ((ModelMetricRollup, dict(model_id=record.model_id)),
+                         (DailyMetricRollup, dict(day=record.created_at.date(), model_id=record.model_id))):
+        values = {getattr(rollup, f"{metric}_sum"): getattr(rollup, f"{metric}_sum") + value
+                  for metric, value in metrics.items()}
+        values[rollup.diagnoses] = rollup.diagnoses + 1
+        extra = {}
+        if rollup is ModelMetricRollup:
+            values[rollup.best_accuracy] = case(
+                (rollup.best_accuracy.is_(None), metrics['accuracy']),
+                (rollup.best_accuracy < metrics['accuracy'], metrics['accuracy']),
+                else_=rollup.best_accuracy)
+            values[rollup.last_diagnosis_at] = case(
+                (rollup.last_diagnosis_at.is_(None), record.created_at),
+                (rollup.last_diagnosis_at < record.created_at, record.created_at),
+                else_=rollup.last_diagnosis_at)
+            extra = dict(best_accuracy=metrics['accuracy'], last_diagnosis_at=record.created_at)
+        _increment(rollup, keys, values, dict(initial, **extra))
+
+
+def _recompute(rollup, keys, records):
+    # 最大值无法增量撤销，删除记录后按索引重新聚合受影响的汇总行
+    row = records.with_entities(
+        func.count(DiagnosisRecord.record_id),
+        *[func.coalesce(func.sum(getattr(DiagnosisRecord, metric)), 0.0) for metric in METRICS],
+        func.max(DiagnosisRecord.accuracy),
+        func.max(DiagnosisRecord.created_at)
+    ).one()
+    if not row[0]:
+        db.session.query(rollup).filter_by(**keys).delete(synchronize_session=False)
+        return
+    values = {f"{metric}_sum": row[i + 1] for i, metric in enumerate(METRICS)}
+    values['diagnoses'] = row[0]
+    if rollup is ModelMetricRollup:
+        values.update(best_accuracy=row[-2], last_diagnosis_at=row[-1])
+    db.session.query(rollup).filter_by(**keys).update(values, synchronize_session=False)
+
+
+def remove_from_rollups(record):
+    """
+    删除诊断记录后更新汇总表，需在记录删除并 flush 之后调用，由调用方提交事务
+    :param record: 被删除的 DiagnosisRecord
+    """
+    if record.created_at is None:
+        return
+    day = record.created_at.date()
+    start, end = _day_bounds(day)
+    same_model = DiagnosisRecord.query.filter(DiagnosisRecord.model_id == record.model_id)
+    _recompute(ModelMetricRollup, dict(model_id=record.model_id), same_model)
+    _recompute(DailyMetricRollup, dict(day=day, model_id=record.model_id),
+               same_model.filter(DiagnosisRecord.created_at >= start, DiagnosisRecord.created_at < end))
+
+
+def _averages(row):
+    return {metric: (getattr(row, f"{metric}_sum") / row.diagnoses if row.diagnoses else None)
+            for metric in METRICS}
+
+
+# 诊断指标统计：各模型的平均指标、每天的指标趋势，指定数据文件时给出该数据集上各模型的最好结果
+@bp.route('/statistics', methods=['GET'])
+def get_statistics():
+    try:
+        date_to = date.fromisoformat(request.args['date_to']) if request.args.get('date_to') else date.today()
+        date_from = date.fromisoformat(request.args['date_from']) if request.args.get('date_from') \
+            else date_to - timedelta(days=29)
+        model_id = int(request.args['model_id']) if request.args.get('model_id') else None
+        file_id = int(request.args['file_id']) if request.args.get('file_id') else None
+
+        models_query = db.session.query(ModelMetricRollup, Model.model_name) \
+            .outerjoin(Model, Model.model_id == ModelMetricRollup.model_id)
+        daily_query = DailyMetricRollup.query.filter(DailyMetricRollup.day >= date_from,
+                                                     DailyMetricRollup.day <= date_to)
+        if model_id is not None:
+            models_query = models_query.filter(ModelMetricRollup.model_id == model_id)
+            daily_query = daily_query.filter(DailyMetricRollup.model_id == model_id)
+
+        models_data = [dict(
+            model_id=rollup.model_id,
+            model_name=model_name or 'Unknown',
+            diagnoses=rollup.diagnoses,
+            best_accuracy=rollup.best_accuracy,
+            last_diagnosis_at=rollup.last_diagnosis_at,
+            **_averages(rollup)
+        ) for rollup, model_name in models_query.order_by(ModelMetricRollup.model_id).all()]
+
+        daily_data = [dict(
+            day=rollup.day.isoformat(),
+            model_id=rollup.model_id,
+            diagnoses=rollup.diagnoses,
+            **_averages(rollup)
+        ) for rollup in daily_query.order_by(DailyMetricRollup.day, DailyMetricRollup.model_id).all()]
+
+        result = dict(models=models_data, daily=daily_data, date_from=date_from.isoformat(),
+                      date_to=date_to.isoformat())
+
+        if file_id is not None:
+            # 单个数据集上的诊断记录数量有限，按 file_id 索引直接聚合数值列
+            best = db.session.query(
+                DiagnosisRecord.model_id,
+                Model.model_name,
+                func.count(DiagnosisRecord.record_id).label('diagnoses'),
+                func.max(DiagnosisRecord.accuracy).label('best_accuracy'),
+                func.max(DiagnosisRecord.f1).label('best_f1')
+            ).outerjoin(Model, Model.model_id == DiagnosisRecord.model_id) \
+                .filter(DiagnosisRecord.file_id == file_id, DiagnosisRecord.accuracy.isnot(None)) \
+                .group_by(DiagnosisRecord.model_id, Model.model_name) \
+                .order_by(func.max(DiagnosisRecord.accuracy).desc()).all()
+            result['best_models'] = [dict(
+                model_id=row.model_id,
+                model_name=row.model_name or 'Unknown',
+                diagnoses=row.diagnoses,
+                best_accuracy=row.best_accuracy,
+                best_f1=row.best_f1
+            ) for row in best]
+
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify(message=f"Invalid query parameter: {str(e)}"), 400
+    except Exception as e:
+        logger.error(f"Error fetching statistics: {str(e)}")
+        return jsonify(message="Internal server error"), 500
@@ -1,7 +1,9 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, g
 from models import db, User
+from .pagination import paginate, invalidate_count, PaginationError
+from .write_behind import last_login_buffer
+from .auth_context import login_required, token_cache
 from datetime import datetime
-import jwt
 
 # 创建蓝图
 bp = Blueprint('user_management', __name__)
@@ -9,16 +11,26 @@ bp = Blueprint('user_management', __name__)
 # 获取用户信息
 @bp.route('/api/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
+    query = db.session.query(User.user_id, User.username, User.email, User.role, User.created_at, User.last_login)
+    try:
+        users, meta = paginate(query, User.created_at, User.user_id, 'Users')
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     user_data = [{
         'user_id': user.user_id,
         'username': user.username,
         'email': user.email,
         'role': user.role,
         'created_at': user.created_at,
-        'last_login': user.last_login
+        'last_login': last_login_buffer.pending(user.user_id, 'last_login', user.last_login)  # 包含尚未写入的登录时间
     } for user in users]
-    return jsonify(user_data)
+    # 响应体保持为用户数组，分页信息放在响应头中
+    response = jsonify(user_data)
+    if meta.get('next_cursor'):
+        response.headers['X-Next-Cursor'] = meta['next_cursor']
+    if 'total' in meta:
+        response.headers['X-Total-Count'] = str(meta['total'])
+    return response
 
 # 删除用户
 @bp.route('/api/users/<int:user_id>', methods=['DELETE'])
@@ -26,32 +38,19 @@ def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    invalidate_count('Users')
+    token_cache.discard_user(user_id)
     return jsonify({"message": "用户已删除"}), 200
 
 # 更新用户最后登录时间
 @bp.route('/api/users/login/<int:user_id>', methods=['PUT'])
 def update_last_login(user_id):
-    user = User.query.get_or_404(user_id)
-    user.last_login = datetime.utcnow()
-    db.session.commit()
+    User.query.get_or_404(user_id)
+    last_login_buffer.put(user_id, last_login=datetime.utcnow())
     return jsonify({"message": "登录时间已更新"}), 200
 
-# 获取当前用户信息
+# 获取当前用户信息，token 由请求开始时的认证层校验
 @bp.route('/api/current_user', methods=['GET'])
+@login_required
 def get_current_user():
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({'error': '用户未登录'}), 401
-
-    try:
-        token = token.split(" ")[1]
-        payload = jwt.decode(token, 'your_secret_key', algorithms=['HS256'])
-        username = payload.get('username')
-        if not username:
-            return jsonify({'error': '无效的 token'}), 401
-        return jsonify({'username': username})
-
-    except jwt.ExpiredSignatureError:
-        return jsonify({'error': 'token 已过期'}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({'error': '无效的 token'}), 401
+    return jsonify({'username': g.current_user.username})
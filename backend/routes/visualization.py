@@ -0,0 +1,99 @@
+# visualization.py
+# 诊断结果的可视化：只使用无界面的 Agg 后端，直接构造 Figure 而不经过 pyplot 的全局状态，
+# 推理进程内的多个线程可以同时绘图。降维图不在诊断时绘制，而是保存 logits 样本，在第一次查看时再计算。
+import os
+import time
+
+import numpy as np
+import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from sklearn.decomposition import PCA
+from sklearn.manifold import TSNE
+
+# 可选的降维方法
+EMBEDDING_METHODS = ('tsne', 'pca')
+
+
+def _save_figure(figure, path):
+    # 先写临时文件再替换，并发请求不会读到写了一半的图像
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp.png'
+    FigureCanvasAgg(figure)
+    figure.savefig(tmp_path)
+    os.replace(tmp_path, path)
+
+
+# 绘制混淆矩阵
+def render_confusion_matrix(conf_matrix, classes, path):
+    figure = Figure(figsize=(7.5, 6))
+    ax = figure.add_subplot(1, 1, 1)
+    sns.heatmap(conf_matrix, annot=True, fmt="d", cmap="Blues", cbar=True, xticklabels=classes, yticklabels=classes,
+                ax=ax)
+    ax.set_xlabel('Predicted labels')
+    ax.set_ylabel('True labels')
+    _save_figure(figure, path)
+
+
+# 保存用于降维可视化的 logits 样本
+def save_embedding_sample(path, logits, labels):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez_compressed(tmp_path, logits=logits, labels=labels)
+    os.replace(tmp_path, path)
+
+
+# 分层抽样：每个类别按比例保留，且每个类别至少保留一个点
+def stratified_subsample(labels, max_points, seed=42):
+    if len(labels) <= max_points:
+        return np.arange(len(labels))
+    rng = np.random.default_rng(seed)
+    classes, counts = np.unique(labels, return_counts=True)
+    quotas = np.maximum(np.floor(counts * max_points / len(labels)).astype(int), 1)
+    indices = [rng.choice(np.flatnonzero(labels == label), size=min(quota, count), replace=False)
+               for label, quota, count in zip(classes, quotas, counts)]
+    return np.sort(np.concatenate(indices))
+
+
+def _project(logits, method):
+    if method == 'pca':
+        return PCA(n_components=2, random_state=42).fit_transform(logits)
+    # t-SNE 的 perplexity 必须小于样本数
+    perplexity = min(30.0, max(len(logits) - 1, 1) / 3)
+    return TSNE(n_components=2, random_state=42, perplexity=perplexity).fit_transform(logits)
+
+
+# 推理进程池中的降维绘图任务
+def render_embedding(sample_path, image_path, method='tsne', max_points=1000):
+    """
+    读取诊断时保存的 logits 样本，降维后绘制散点图
+    :param sample_path: logits 样本 npz 文件路径
+    :param image_path: 图像保存路径
+    :param method: 降维方法，见 EMBEDDING_METHODS
+    :param max_points: 参与降维的最大点数，超过时分层抽样
+    :return: 图像路径、实际使用的点数和各阶段耗时
+    """
+    if method not in EMBEDDING_METHODS:
+        raise ValueError(f"Unknown embedding method: {method}")
+
+    with np.load(sample_path) as sample:
+        logits = sample['logits']
+        labels = sample['labels']
+    indices = stratified_subsample(labels, max_points)
+    logits, labels = logits[indices], labels[indices]
+
+    start = time.perf_counter()
+    embedded = _project(logits, method)
+    projected = time.perf_counter()
+    palette = sns.color_palette("Set1", n_colors=len(np.unique(labels)))
+
+    figure = Figure(figsize=(7.5, 6))
+    ax = figure.add_subplot(1, 1, 1)
+    ax.tick_params(axis='both', which='both', bottom=False, top=False, left=False, right=False, labelbottom=False,
+                   labelleft=False)
+    sns.scatterplot(x=embedded[:, 0], y=embedded[:, 1], hue=labels, palette=palette, legend='full', ax=ax)
+    ax.set_title("t-SNE Visualization" if method == 'tsne' else "PCA Visualization")
+    _save_figure(figure, image_path)
+
+    timings = {method: projected - start, 'embedding_plot': time.perf_counter() - projected}
+    return {"image_path": image_path, "points": int(len(labels)), "timings": timings}
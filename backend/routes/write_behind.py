@@ -0,0 +1,175 @@
+# write_behind.py
+# 簿记字段的延迟批量写入：登录时间等高频的小更新先在内存中按主键合并，
+# 由后台线程按时间间隔或数量阈值用一次批量 UPDATE 写入，进程正常退出或收到 SIGTERM 时写完剩余的更新。
+import atexit
+import logging
+import signal
+import threading
+
+from flask import current_app
+from sqlalchemy import bindparam, update
+
+from config import Config
+from models import db, User
+
+logger = logging.getLogger(__name__)
+
+# 进程中所有的缓冲区，收到 SIGTERM 时逐个写完
+_buffers = []
+
+
+class WriteBehindBuffer:
+    """
+    按主键合并更新并批量写入
+    :param mapper: 模型类
+    :param key: 主键属性名
+    :param flush_interval: 写入间隔，单位为秒
+    :param max_pending: 待写入的行数达到该值时立即写入
+    """
+
+    def __init__(self, mapper, key, flush_interval=None, max_pending=None):
+        self.mapper = mapper
+        self.key = key
+        self.flush_interval = flush_interval or Config.WRITE_BEHIND_FLUSH_INTERVAL
+        self.max_pending = max_pending or Config.WRITE_BEHIND_MAX_PENDING
+        self._pending = {}  # 主键 -> 合并后的字段值
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._app = None
+        self._thread = None
+        self._closed = False
+        _buffers.append(self)
+
+    def put(self, key, **values):
+        """
+        登记一行的更新，同一行的多次更新只保留最新的值
+        :param key: 主键值
+        """
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._pending.setdefault(key, {}).update(values)
+                full = len(self._pending) >= self.max_pending
+                if self._thread is None:
+                    self._start()
+        if closed:
+            # 已停止后台写入时直接在当前请求中写入
+            self._write({key: values})
+        elif full:
+            self._wakeup.set()
+
+    def pending(self, key, name, default=None):
+        """
+        读取尚未写入的字段值，列表接口据此返回最新的数据
+        """
+        with self._lock:
+            return self._pending.get(key, {}).get(name, default)
+
+    def _start(self):
+        # 首次登记更新时启动写入线程，线程内通过应用上下文访问数据库
+        self._app = current_app._get_current_object()
+        self._thread = threading.Thread(target=self._run, name=f'write-behind-{self.mapper.__tablename__}',
+                                        daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _write(self, batch):
+        # 按更新的字段分组，每组一条 executemany 的 UPDATE；期间被删除的行直接跳过
+        groups = {}
+        for key, values in batch.items():
+            groups.setdefault(tuple(sorted(values)), []).append(dict(values, _key=key))
+        table = self.mapper.__table__
+        with (self._app or current_app._get_current_object()).app_context():
+            try:
+                for names, params in groups.items():
+                    statement = update(table).where(table.c[self.key] == bindparam('_key')) \
+                        .values({name: bindparam(name) for name in names})
+                    db.session.execute(statement, params)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+
+    def flush(self):
+        """
+        写入当前合并的全部更新
+        :return: 写入的行数
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Write-behind flush of {len(batch)} {self.mapper.__tablename__} rows failed: {str(e)}")
+                # 放回缓冲区等待下次写入，期间产生的新值优先
+                with self._lock:
+                    for key, values in batch.items():
+                        merged = dict(values)
+                        merged.update(self._pending.get(key, {}))
+                        self._pending[key] = merged
+                return 0
+            return len(batch)
+
+    def shutdown(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        # 写入线程退出后剩余的更新
+        self.flush()
+
+
+def shutdown_all():
+    for buffer in list(_buffers):
+        buffer.shutdown()
+
+
+_previous_sigterm = None
+
+
+def _handle_sigterm(signum, frame):
+    # 信号处理函数在主线程中执行，主线程此时可能正持有缓冲区的锁，因此在独立线程中写入并限时等待
+    drain = threading.Thread(target=shutdown_all, name='write-behind-drain', daemon=True)
+    drain.start()
+    drain.join(timeout=Config.WRITE_BEHIND_FLUSH_INTERVAL + 10)
+
+    # 继续执行原来的处理：gunicorn 等服务器自己的优雅退出，或默认的退出（同时执行 atexit 清理）
+    if callable(_previous_sigterm):
+        _previous_sigterm(signum, frame)
+    elif _previous_sigterm != signal.SIG_IGN:
+        raise SystemExit(128 + signum)
+
+
+def install_sigterm_handler():
+    """
+    收到 SIGTERM（systemd、docker、gunicorn 的正常停止信号）时写完剩余的更新；atexit 不会处理 SIGTERM。
+    只能在主线程中调用，服务器已安装的处理函数会在写完后继续执行
+    """
+    global _previous_sigterm
+    if threading.current_thread() is not threading.main_thread():
+        logger.warning("Write-behind SIGTERM handler not installed: not in the main thread")
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+    if previous is _handle_sigterm:
+        return
+    _previous_sigterm = previous
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+
+
+# 用户最后登录时间
+last_login_buffer = WriteBehindBuffer(User, 'user_id')
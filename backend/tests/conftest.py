@@ -0,0 +1,19 @@
+# conftest.py
+# 测试结束时汇总输出热点查询的耗时（test_query_plans.py 通过 record_property 记录的 query_ms）
+
+
+def pytest_terminal_summary(terminalreporter):
+    timings = []
+    for report in terminalreporter.stats.get('passed', []) + terminalreporter.stats.get('failed', []):
+        if report.when != 'call':
+            continue
+        properties = dict(report.user_properties)
+        if 'query_ms' in properties:
+            name = report.nodeid.split('[', 1)[-1].rstrip(']')
+            timings.append((name, properties['query_ms'], report.outcome))
+    if not timings:
+        return
+    terminalreporter.section('hot query timings (median, ms)')
+    for name, elapsed, outcome in timings:
+        status = 'FAIL' if outcome == 'failed' else 'ok'
+        terminalreporter.write_line(f"{status:4} {elapsed:8.2f} ms  {name}")
@@ -0,0 +1,173 @@
+# test_query_plans.py
+# 热点查询的执行计划检查：在临时数据库中写入大量合成数据，
+# 确认上传查重、列表分页、诊断记录过滤等热点查询都走索引而不是全表扫描，并在测试结束时报告各查询的耗时。
+# 用法（在 backend 目录下）：python -m pytest tests/test_query_plans.py
+# QUERY_PLAN_ROWS 设置合成数据量，QUERY_PLAN_REPEAT 设置每个查询计时的执行次数，
+# QUERY_PLAN_DATABASE_URI 指定一个空的 MySQL 等数据库代替临时 SQLite 文件
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import and_, create_engine, insert, or_, select, text
+
+from models import db, User, File, Model, DiagnosisRecord, DataManagement, Report
+
+ROWS = int(os.environ.get('QUERY_PLAN_ROWS', 20000))
+REPEAT = int(os.environ.get('QUERY_PLAN_REPEAT', 5))
+SEED_CHUNK = 5000
+START = datetime(2024, 1, 1)
+
+
+# 写入合成数据：rows 个文件和诊断记录，模型、用户和数据管理记录按比例生成
+def seed(engine, rows):
+    models = max(rows // 10, 1)
+    users = max(rows // 10, 1)
+
+    def chunks(count, make):
+        for offset in range(0, count, SEED_CHUNK):
+            yield [make(i) for i in range(offset, min(offset + SEED_CHUNK, count))]
+
+    with engine.begin() as conn:
+        for batch in chunks(users, lambda i: dict(username=f"user_{i}", password_hash='x', role='user',
+                                                  created_at=START + timedelta(minutes=i))):
+            conn.execute(insert(User.__table__), batch)
+        for batch in chunks(rows, lambda i: dict(file_name=f"file_{i}.zip", file_path=f"./uploads/file_{i}.zip",
+                                                 file_size='1024', upload_time=START + timedelta(seconds=i),
+                                                 content_hash=f"{i:064x}")):
+            conn.execute(insert(File.__table__), batch)
+        for batch in chunks(models, lambda i: dict(model_name=f"model_{i}.pt", model_path=f"./models/model_{i}.pt",
+                                                   model_size='1024', upload_time=START + timedelta(seconds=i))):
+            conn.execute(insert(Model.__table__), batch)
+        for batch in chunks(rows, lambda i: dict(report_name=f"report_{i}", report_format='PDF',
+                                                 report_path=f"./reports/report_{i}.pdf", status='ready',
+                                                 created_at=START + timedelta(seconds=i))):
+            conn.execute(insert(Report.__table__), batch)
+        for batch in chunks(rows, lambda i: dict(file_id=i % rows + 1, model_id=i % models + 1, report_id=i + 1,
+                                                 diagnosis_result='{}', cache_key=f"{i:064x}",
+                                                 created_at=START + timedelta(seconds=i))):
+            conn.execute(insert(DiagnosisRecord.__table__), batch)
+        for batch in chunks(rows, lambda i: dict(data_type='file', data_id_related=i + 1,
+                                                 upload_time=START + timedelta(seconds=i))):
+            conn.execute(insert(DataManagement.__table__), batch)
+
+    # 更新统计信息，让查询优化器按真实的数据分布选择执行计划
+    with engine.begin() as conn:
+        if engine.dialect.name == 'sqlite':
+            conn.execute(text("ANALYZE"))
+        elif engine.dialect.name == 'mysql':
+            for table in db.metadata.sorted_tables:
+                conn.execute(text(f"ANALYZE TABLE `{table.name}`"))
+
+
+# 诊断记录列表的联表查询，与 report.get_diagnosis_records 相同
+def diagnosis_records_page(*conditions):
+    return select(DiagnosisRecord.record_id, DiagnosisRecord.created_at, File.file_name, Model.model_name,
+                  Report.report_path, Report.report_name, Report.status) \
+        .outerjoin(File, File.file_id == DiagnosisRecord.file_id) \
+        .outerjoin(Model, Model.model_id == DiagnosisRecord.model_id) \
+        .outerjoin(Report, Report.report_id == DiagnosisRecord.report_id) \
+        .where(*conditions) \
+        .order_by(DiagnosisRecord.created_at.desc(), DiagnosisRecord.record_id.desc()).limit(50)
+
+
+# 热点查询：名称 -> (语句, 是否要求利用索引完成排序)
+def hot_queries(rows):
+    middle = START + timedelta(seconds=rows // 2)
+    return {
+        "upload_file duplicate check": (select(File.file_id).where(File.file_name == f"file_{rows // 2}.zip"), False),
+        "upload_model duplicate check": (select(Model.model_id).where(Model.model_name == "model_1.pt"), False),
+        "file content hash lookup": (select(File.file_id).where(File.content_hash == f"{rows // 2:064x}"), False),
+        "get_files first page": (
+            select(File.file_id, File.file_name, File.upload_time)
+            .order_by(File.upload_time.desc(), File.file_id.desc()).limit(20), True),
+        "get_files cursor page": (
+            select(File.file_id, File.file_name, File.upload_time)
+            .where(or_(File.upload_time < middle, and_(File.upload_time == middle, File.file_id < rows // 2)))
+            .order_by(File.upload_time.desc(), File.file_id.desc()).limit(20), True),
+        "get_models first page": (
+            select(Model.model_id, Model.model_name, Model.upload_time)
+            .order_by(Model.upload_time.desc(), Model.model_id.desc()).limit(20), True),
+        "data_management first page": (
+            select(DataManagement.data_id, DataManagement.upload_time)
+            .order_by(DataManagement.upload_time.desc(), DataManagement.data_id.desc()).limit(20), True),
+        "users first page": (
+            select(User.user_id, User.created_at)
+            .order_by(User.created_at.desc(), User.user_id.desc()).limit(20), True),
+        "diagnosis records by file": (
+            select(DiagnosisRecord.record_id).where(DiagnosisRecord.file_id == rows // 2), False),
+        "diagnosis records by model": (
+            select(DiagnosisRecord.record_id).where(DiagnosisRecord.model_id == 1).limit(50), False),
+        "diagnosis records latest page": (
+            select(DiagnosisRecord.record_id, DiagnosisRecord.created_at)
+            .order_by(DiagnosisRecord.created_at.desc(), DiagnosisRecord.record_id.desc()).limit(50), True),
+        "diagnosis records date range": (
+            select(DiagnosisRecord.record_id)
+            .where(DiagnosisRecord.created_at >= middle, DiagnosisRecord.created_at < middle + timedelta(hours=1)),
+            False),
+        "diagnosis result cache lookup": (
+            select(DiagnosisRecord.record_id).where(DiagnosisRecord.cache_key == f"{rows // 2:064x}"), False),
+        "get_diagnosis_records joined page": (diagnosis_records_page(), True),
+        "get_diagnosis_records by model": (diagnosis_records_page(DiagnosisRecord.model_id == 1), True),
+        "get_diagnosis_records by file and date range": (
+            diagnosis_records_page(DiagnosisRecord.file_id == rows // 2,
+                                   DiagnosisRecord.created_at >= START,
+                                   DiagnosisRecord.created_at <= middle + timedelta(days=1)), True),
+    }
+
+
+# 返回执行计划中的问题列表，空列表表示走了索引
+def plan_problems(conn, statement, ordered):
+    sql = str(statement.compile(conn.engine, compile_kwargs={"literal_binds": True}))
+    dialect = conn.engine.dialect.name
+    problems = []
+    if dialect == 'sqlite':
+        for detail in (row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))):
+            if detail.startswith('SCAN') and 'USING' not in detail:
+                problems.append(f"full scan: {detail}")
+            if ordered and 'TEMP B-TREE FOR ORDER BY' in detail:
+                problems.append(f"sort without index: {detail}")
+    elif dialect == 'mysql':
+        for row in (dict(row._mapping) for row in conn.execute(text(f"EXPLAIN {sql}"))):
+            if row.get('type') == 'ALL':
+                problems.append(f"full scan of {row.get('table')}")
+            if ordered and 'Using filesort' in (row.get('Extra') or ''):
+                problems.append(f"filesort on {row.get('table')}")
+    else:
+        pytest.skip(f"Query plan checks are not implemented for {dialect}")
+    return problems
+
+
+# 执行 repeat 次，返回耗时的中位数，单位为毫秒
+def time_query(conn, statement, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(statement).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+@pytest.fixture(scope='module')
+def engine(tmp_path_factory):
+    database_uri = os.environ.get('QUERY_PLAN_DATABASE_URI') or \
+        f"sqlite:///{tmp_path_factory.mktemp('query-plans') / 'plans.db'}"
+    engine = create_engine(database_uri)
+    db.metadata.create_all(engine)
+    with engine.connect() as conn:
+        if conn.execute(select(File.file_id).limit(1)).first() is not None:
+            pytest.fail("The database is not empty, use a scratch database for this check")
+    seed(engine, ROWS)
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize('name', list(hot_queries(ROWS)))
+def test_hot_query_uses_index(engine, name, record_property):
+    statement, ordered = hot_queries(ROWS)[name]
+    with engine.connect() as conn:
+        problems = plan_problems(conn, statement, ordered)
+        # 耗时由 conftest.py 在测试结束时汇总输出
+        record_property('query_ms', time_query(conn, statement, REPEAT))
+    assert not problems, f"{name}: " + '; '.join(problems)
@@ -0,0 +1,28 @@
+// 列表接口使用游标分页：依次请求下一页，直到后端不再返回 next_cursor
+import axios from 'axios';
+
+// 每次请求的条数，与后端 LIST_MAX_LIMIT 一致
+const PAGE_LIMIT = 1000;
+
+/**
+ * 获取列表接口的全部记录
+ * @param {string} url 列表接口地址
+ * @param {function} getItems 从响应体中取出当前页记录的函数
+ * @param {object} params 其他查询参数
+ * @returns {Promise<Array>} 全部记录
+ */
+export async function fetchAllPages(url, getItems, params = {}) {
+  const items = [];
+  const seen = new Set();
+  let cursor = null;
+  do {
+    seen.add(cursor);
+    const response = await axios.get(url, {
+      params: { ...params, limit: PAGE_LIMIT, with_total: false, ...(cursor ? { cursor } : {}) },
+    });
+    items.push(...getItems(response.data));
+    // 响应体为数组的接口（如 /api/users）把游标放在 X-Next-Cursor 响应头中
+    cursor = response.data.next_cursor || response.headers['x-next-cursor'] || null;
+  } while (cursor && !seen.has(cursor));  // 游标重复时停止，避免死循环
+  return items;
+}